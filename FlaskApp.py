@@ -1,20 +1,36 @@
 import csv
-from flask import Flask, render_template, request, redirect, session, send_from_directory, Response, jsonify
-import os, random, sqlite3, qrcode, io, base64
+from flask import Flask, render_template, request, redirect, session, send_from_directory, Response, jsonify, make_response
+import os, random, sqlite3, qrcode, io, base64, binascii, json, hashlib
 from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time as dt_time
 from zoneinfo import ZoneInfo
 from flask import jsonify, request
-from db import fetchone, fetchall, execute
+from db import (
+    fetchone, fetchall, execute, iter_rows, transaction, dns_stats,
+    register_query, fetchone_named, fetchall_named, execute_named, query_stats,
+    begin_request_log, request_log, request_wrote, read_only, replica_status
+)
+import db_async
+import db_listen
+from serializers import (
+    json_row, visitor_columns, project_fields, VISITOR_LIST_FIELDS, GUARD_VISITOR_FIELDS,
+    GUARD_TODAY_FIELDS, PREMISES_INSIDE_FIELDS, PREMISES_LEFT_FIELDS
+)
+from fastjson import FastJSONProvider, stream_json_array
+from compression import compress_response
+from notification_hub import hub as notification_hub
 from supabase import create_client, Client
 import mimetypes
+import time
 import uuid
+from functools import wraps
 import smtplib
 from email.mime.text import MIMEText
 import requests
 
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'
+app.json = FastJSONProvider(app)  # orjson for jsonify() when installed
 
 # ---------------- CONFIG ----------------
 UPLOAD_FOLDER = os.path.join('static', 'uploads')
@@ -27,6 +43,104 @@ SUPABASE_BUCKET = "visitor-ids"
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# Same query run this many times in one request is logged as a likely N+1
+REPEATED_QUERY_WARN = int(os.environ.get("DB_REPEATED_QUERY_WARN", "3"))
+
+# /api/admin/visitors page size when ?limit is given without a value / upper bound
+VISITORS_PAGE_SIZE = 50
+VISITORS_MAX_PAGE_SIZE = 500
+
+# ?q= search text on /api/admin/visitors; same expression as the trigram
+# index in migrations/0003_visitors_search_trgm.sql
+VISITOR_SEARCH_SQL = "(coalesce(name, '') || ' ' || coalesce(person_to_visit, '') || ' ' || coalesce(reason, ''))"
+
+# Max approved visitors per visit date (daily_capacity, migration 0005)
+DAILY_VISITOR_LIMIT = int(os.environ.get("DAILY_VISITOR_LIMIT", "5"))
+
+# /api/notifications/stream: comment line sent to idle streams this often
+# (keeps proxies from closing them), and streams are ended after
+# SSE_MAX_SECONDS so the client reconnects (with Last-Event-ID)
+SSE_KEEPALIVE_SECONDS = 15
+SSE_MAX_SECONDS = 30 * 60
+
+# Roles notifications are addressed to (target_role)
+NOTIFICATION_ROLES = ("admin", "guard", "dep_head")
+
+# Notification types add_notifications replaces per visitor + target
+# (upsert_decision_notifications) instead of adding
+DECISION_NOTIFICATION_TYPES = ("APPROVED", "DECLINED")
+
+# /api/notifications page size (?limit=) default / upper bound
+NOTIFICATIONS_PAGE_SIZE = 100
+NOTIFICATIONS_MAX_PAGE_SIZE = 500
+
+# Largest NOTIFY payload sent as-is (Postgres limit is 8000 bytes)
+NOTIFY_PAYLOAD_MAX = 7500
+
+# After a client changes something, its reads stay on the primary this long
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("DB_READ_YOUR_WRITES_SECONDS", "10"))
+
+
+# ---------------- RESPONSE COMPRESSION ----------------
+# Registered first so it runs after every other after_request hook
+@app.after_request
+def compress(response):
+    return compress_response(response)
+
+
+# ---------------- QUERY INSTRUMENTATION ----------------
+@app.before_request
+def start_query_log():
+    begin_request_log()
+
+
+@app.after_request
+def add_server_timing(response):
+    queries = request_log()
+    if not queries:
+        return response
+
+    total_ms = sum(q["duration_ms"] for q in queries)
+    acquire_ms = sum(q["acquire_ms"] for q in queries)
+
+    response.headers.add(
+        "Server-Timing",
+        f'db;dur={total_ms:.1f};desc="{len(queries)} queries", db-acquire;dur={acquire_ms:.1f}'
+    )
+
+    counts = {}
+    for q in queries:
+        counts[q["fingerprint"]] = counts.get(q["fingerprint"], 0) + 1
+    repeated = {fp: n for fp, n in counts.items() if n >= REPEATED_QUERY_WARN}
+    if repeated:
+        app.logger.warning("repeated queries in %s %s: %s", request.method, request.path, repeated)
+
+    return response
+
+
+@app.after_request
+def remember_db_write(response):
+    # Read-your-writes: see replica_reads()
+    if request_wrote():
+        session["db_wrote_at"] = time.time()
+    return response
+
+
+def replica_reads(view):
+    # For read-only endpoints: their queries may be served by the read
+    # replica (READ_DATABASE_URL). A session that wrote in the last
+    # READ_YOUR_WRITES_SECONDS keeps reading from the primary.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        wrote_at = session.get("db_wrote_at")
+        if wrote_at and time.time() - wrote_at < READ_YOUR_WRITES_SECONDS:
+            return view(*args, **kwargs)
+
+        with read_only():
+            return view(*args, **kwargs)
+
+    return wrapper
+
 
 # ---------------- DATABASES ----------------
 def init_visitor_database():
@@ -248,6 +362,310 @@ migrate_visitors_add_decision_fields()
 init_notifications_database()
 
 
+# ---------------- NAMED QUERIES ----------------
+# Hot SQL run on most requests. Registered once, prepared once per pooled
+# connection and called by name (see db.register_query).
+def notify_inserted(insert_sql) -> str:
+    # Wraps an "insert into public.notifications ... returning ..." so the
+    # same statement sends one NOTIFY per row, delivered to every worker's
+    # listener on commit. The channel must match notification_channel();
+    # rows too big for a NOTIFY payload (8000 bytes) are sent as id + scope
+    # and read back by dispatch_notification().
+    return f"""
+    with inserted as ({insert_sql}),
+    payloads as (
+        select
+            i.id, i.target_role, i.target_department,
+            case
+                when i.target_role = 'dep_head' and nullif(i.target_department, '') is not null
+                    then 'notifications_dep_head_' || left(md5(i.target_department), 12)
+                else 'notifications_' || i.target_role
+            end as channel,
+            json_build_object(
+                'id', i.id,
+                'target_role', i.target_role,
+                'target_department', i.target_department,
+                'title', i.title,
+                'body', i.body,
+                'type', i.type,
+                'visitor_id', i.visitor_id,
+                'created_at', i.created_at,
+                'is_read', i.is_read
+            )::text as payload
+        from inserted i
+    )
+    select pg_notify(
+        channel,
+        case
+            when octet_length(payload) <= {NOTIFY_PAYLOAD_MAX} then payload
+            else json_build_object(
+                'id', id, 'target_role', target_role, 'target_department', target_department
+            )::text
+        end
+    )
+    from payloads
+    """
+
+
+# One statement (and round-trip) for the whole fan-out, NOTIFYs included:
+# the (role, department) pairs are passed as two arrays, so guard +
+# dep_head (+ admin) cost one round-trip.
+register_query("insert_notifications", notify_inserted("""
+    insert into public.notifications
+        (target_role, target_department, title, body, type, visitor_id, created_at, is_read)
+    select
+        t.target_role, t.target_department, %s, %s, %s, %s, %s, false
+    from unnest(%s::text[], %s::text[]) as t(target_role, target_department)
+    returning id, target_role, target_department, title, body, type, visitor_id, created_at, is_read
+"""))
+
+# Decision notifications (DECISION_NOTIFICATION_TYPES) are one per visitor
+# and target: a new decision replaces the old row in place (key: migration
+# 0008). The replaced row takes a fresh id so it sorts, pages and streams
+# as the newest notification, and it is unread again.
+register_query("upsert_decision_notifications", notify_inserted("""
+    insert into public.notifications as n
+        (target_role, target_department, title, body, type, visitor_id, created_at, is_read)
+    select
+        t.target_role, t.target_department, %s, %s, %s, %s, %s, false
+    from unnest(%s::text[], %s::text[]) as t(target_role, target_department)
+    on conflict (visitor_id, target_role, coalesce(target_department, ''))
+        where type in ('APPROVED', 'DECLINED')
+    do update set
+        id = default,
+        title = excluded.title,
+        body = excluded.body,
+        type = excluded.type,
+        created_at = excluded.created_at,
+        is_read = false
+    returning id, target_role, target_department, title, body, type, visitor_id, created_at, is_read
+"""))
+
+register_query("visitor_brief", """
+    select
+        name,
+        department,
+        person_to_visit,
+        reason,
+        visit_date,
+        visit_time,
+        decision_note
+    from public.visitors
+    where id = %s
+""")
+
+register_query("visitor_email", """
+    select email
+    from public.visitors
+    where id = %s
+""")
+
+register_query("duplicate_appointment", """
+    select id
+    from public.visitors
+    where name = %s
+      and visit_date = %s
+      and visit_time = %s
+    limit 1
+""")
+
+# Daily cap: approved visitors per date live in public.daily_capacity and
+# change in the same transaction as the visitor's status.
+register_query("approved_count_for_date", """
+    select coalesce(
+        (select approved from public.daily_capacity where visit_date = %s), 0
+    ) as total
+""")
+
+# Takes one slot for the date if it is below the limit; params are
+# (visit_date, limit, limit). The upsert locks the date's row, so concurrent
+# approvals queue up and the limit holds exactly. No row = the date is full.
+register_query("reserve_capacity", """
+    insert into public.daily_capacity as c (visit_date, approved)
+    select %s, 1
+    where %s > 0
+    on conflict (visit_date) do update
+        set approved = c.approved + 1,
+            updated_at = now()
+        where c.approved < %s
+    returning approved
+""")
+
+register_query("release_capacity", """
+    update public.daily_capacity
+    set approved = approved - 1,
+        updated_at = now()
+    where visit_date = %s
+      and approved > 0
+""")
+
+register_query("disabled_date_probe", """
+    select 1
+    from public.disabled_dates
+    where date = %s
+    limit 1
+""")
+
+register_query("dep_head_department_probe", """
+    select 1
+    from public.admin_accounts
+    where role = 'dep_head'
+      and department = %s
+    limit 1
+""")
+
+register_query("guard_today", f"""
+    select
+        {visitor_columns(GUARD_TODAY_FIELDS)}
+    from public.visitors
+    where status = 'Approved'
+      and visit_date = %s
+    order by visit_time asc
+""")
+
+# ETag versions of visitor lists: row count plus a digest of the
+# (id, updated_xid) pairs the list would return. updated_xid (migration
+# 0009) changes with every write, and a digest of the visible rows changes
+# when a slow transaction commits, unlike max(updated_at): that is stamped
+# at write time, so an older stamp committing late never moves the max.
+register_query("guard_today_version", """
+    select count(*) as total,
+           md5(coalesce(string_agg(id::text || ':' || updated_xid::text, ',' order by id), '')) as version
+    from public.visitors
+    where status = 'Approved'
+      and visit_date = %s
+""")
+
+# /api/premises-status lists; the "_department" variants are the dep_head
+# view and take the department as the last param
+for _suffix, _filter in (("", ""), ("_department", " and department = %s")):
+    register_query(f"premises_inside{_suffix}", f"""
+        select
+            {visitor_columns(PREMISES_INSIDE_FIELDS)}
+        from public.visitors
+        where time_in is not null and time_out is null{_filter}
+        order by time_in desc
+    """)
+
+    register_query(f"premises_left{_suffix}", f"""
+        select
+            {visitor_columns(PREMISES_LEFT_FIELDS)}
+        from public.visitors
+        where time_out is not null and visit_date = %s{_filter}
+        order by time_out desc
+        limit 100
+    """)
+
+    # Both lists at once: (department,) + (visit_date,) + (department,)
+    register_query(f"premises_version{_suffix}", f"""
+        select count(*) as total,
+               md5(coalesce(string_agg(id::text || ':' || updated_xid::text, ',' order by id), '')) as version
+        from (
+            (select id, updated_xid
+             from public.visitors
+             where time_in is not null and time_out is null{_filter})
+            union all
+            (select id, updated_xid
+             from public.visitors
+             where time_out is not null and visit_date = %s{_filter}
+             order by time_out desc
+             limit 100)
+        ) t
+    """)
+
+# Notification listings by scope. Each also gets a "<name>_version" query:
+# a digest of the (id, is_read) pairs the listing would return, used as
+# the ETag so an unchanged poll skips the full query.
+NOTIFICATION_SCOPES = {
+    "notifications_for_role": "target_role = %s",
+    "notifications_for_department": "target_role = %s and (target_department = %s or target_department is null)",
+    "notifications_unassigned": "target_role = %s and target_department is null",
+}
+
+# Every query takes the scope params followed by the page size (limit).
+for _name, _where in NOTIFICATION_SCOPES.items():
+    register_query(_name, f"""
+        select id, target_role, target_department, title, body, type, visitor_id, created_at, is_read
+        from public.notifications
+        where {_where}
+        order by id desc
+        limit %s
+    """)
+
+    register_query(f"{_name}_version", f"""
+        select md5(coalesce(string_agg(id::text || ':' || is_read::text, ','), '')) as version
+        from (
+            select id, is_read
+            from public.notifications
+            where {_where}
+            order by id desc
+            limit %s
+        ) t
+    """)
+
+    # Older page (?before_id=), newest first
+    register_query(f"{_name}_before", f"""
+        select id, target_role, target_department, title, body, type, visitor_id, created_at, is_read
+        from public.notifications
+        where {_where}
+          and id < %s
+        order by id desc
+        limit %s
+    """)
+
+    # Newer rows (?after_id=, stream Last-Event-ID resume), oldest first
+    register_query(f"{_name}_since", f"""
+        select id, target_role, target_department, title, body, type, visitor_id, created_at, is_read
+        from public.notifications
+        where {_where}
+          and id > %s
+        order by id
+        limit %s
+    """)
+
+# Unread count per scope from the trigger-maintained counters (migration
+# 0006); unassigned rows are counted under target_department = ''
+UNREAD_COUNT_SCOPES = {
+    "notifications_for_role": "target_role = %s",
+    "notifications_for_department": "target_role = %s and target_department in (%s, '')",
+    "notifications_unassigned": "target_role = %s and target_department = ''",
+}
+
+for _name, _where in UNREAD_COUNT_SCOPES.items():
+    register_query(f"{_name}_unread", f"""
+        select coalesce(sum(unread), 0)::bigint as unread
+        from public.notification_unread
+        where {_where}
+    """)
+
+# Dates at or over the limit (params: limit), and the ETag version of that
+# list: the per-date counts themselves
+FULL_DATES_SQL = """
+    select visit_date, count(*) as total
+    from public.visitors
+    group by visit_date
+    having count(*) >= %s
+"""
+
+register_query("full_dates", FULL_DATES_SQL)
+
+register_query("full_dates_version", f"""
+    select count(*) as total,
+           md5(coalesce(string_agg(visit_date::text || ':' || total::text, ',' order by visit_date), '')) as version
+    from ({FULL_DATES_SQL}) t
+""")
+
+register_query("disabled_dates_version", """
+    select count(*) as total, md5(coalesce(string_agg(date::text, ',' order by date), '')) as version
+    from public.disabled_dates
+""")
+
+register_query("disabled_dates", """
+    select date
+    from public.disabled_dates
+""")
+
+
 # ---------------- EMAIL SETTINGS ----------------
 # Make sure you set these in your .env or system environment variables
 EMAIL_USER = os.environ.get("EMAIL_USER")       # Verified Brevo sender email
@@ -305,36 +723,86 @@ def add_notification(
     visitor_id=None,
     target_department=None
 ):
+    add_notifications(
+        [(target_role, target_department)],
+        title=title,
+        body=body,
+        type_=type_,
+        visitor_id=visitor_id
+    )
+
+
+def add_notifications(targets, title, body, type_, visitor_id=None):
+    # Fan-out writer: targets is a list of (target_role, target_department).
+    # All rows go in with a single insert; a visitor's APPROVED / DECLINED
+    # rows replace its previous decision rows in the same statement.
+    if not targets:
+        return
+
     created_at = datetime.now(ZoneInfo("Asia/Manila"))  # timestamptz
 
-    execute("""
-        insert into public.notifications
-            (target_role, target_department, title, body, type, visitor_id, created_at, is_read)
-        values
-            (%s, %s, %s, %s, %s, %s, %s, false)
-    """, (
-        target_role,
-        target_department,
+    if type_ in DECISION_NOTIFICATION_TYPES and visitor_id is not None:
+        query_name = "upsert_decision_notifications"
+    else:
+        query_name = "insert_notifications"
+
+    # Single statement: inside the caller's transaction() it joins it,
+    # otherwise it commits on its own. Streams in every worker get the rows
+    # via LISTEN once committed (see notify_inserted).
+    execute_named(query_name, (
         title,
         body,
         type_,
         visitor_id,
-        created_at
+        created_at,
+        [role for role, _ in targets],
+        [department for _, department in targets]
     ))
 
+
+def notification_channel(role, department=None) -> str:
+    # LISTEN/NOTIFY channel for new notifications: one per department for
+    # dep_head rows, one per role otherwise (same split as NOTIFICATION_SCOPES).
+    # Computed in SQL by notify_inserted(); keep the two in step.
+    if role == "dep_head" and department:
+        return f"notifications_dep_head_{hashlib.md5(department.encode()).hexdigest()[:12]}"
+    return f"notifications_{role}"
+
+
+def dispatch_notification(payload):
+    # db_listen handler (listener thread): NOTIFY payload -> open streams
+    row = json.loads(payload)
+    if "title" not in row:
+        row = fetchone("""
+            select id, target_role, target_department, title, body, type, visitor_id, created_at, is_read
+            from public.notifications
+            where id = %s
+        """, (row["id"],))
+        if not row:
+            return
+    else:
+        row["created_at"] = datetime.fromisoformat(row["created_at"]) if row["created_at"] else None
+    notification_hub.publish([row])
+
+
+# Events sent while the listener was reconnecting are lost: end the streams
+# so their clients resume from the database (Last-Event-ID)
+db_listen.on_reconnect(notification_hub.close_all)
+
+def reserve_capacity(visit_date) -> bool:
+    # Call inside transaction() when a visitor becomes Approved: takes one of
+    # the date's DAILY_VISITOR_LIMIT slots, False if the date is full.
+    row = fetchone_named("reserve_capacity", (visit_date, DAILY_VISITOR_LIMIT, DAILY_VISITOR_LIMIT))
+    return row is not None
+
+
+def release_capacity(visit_date):
+    # Call inside transaction() when an Approved visitor is declined
+    execute_named("release_capacity", (visit_date,))
+
+
 def get_visitor_brief(visitor_id: int):
-    row = fetchone("""
-        select
-            name,
-            department,
-            person_to_visit,
-            reason,
-            visit_date,
-            visit_time,
-            decision_note
-        from public.visitors
-        where id = %s
-    """, (visitor_id,))
+    row = fetchone_named("visitor_brief", (visitor_id,))
 
     if not row:
         return None
@@ -381,6 +849,138 @@ def build_notif_body_from_fields(
         f"{note_line}"
     )
 
+def encode_visitor_cursor(row) -> str:
+    # Opaque page token: position of the last row in the visitor list order
+    # (row as serialized by json_row, dates already ISO strings)
+    raw = json.dumps([row["visit_date"], row["visit_time"], row["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_visitor_cursor(token: str):
+    # -> (visit_date, visit_time, id); ValueError if the token is garbage
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        visit_date, visit_time, visitor_id = json.loads(base64.urlsafe_b64decode(padded))
+        return (
+            datetime.strptime(visit_date, "%Y-%m-%d").date(),
+            dt_time.fromisoformat(visit_time),
+            int(visitor_id),
+        )
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def encode_since_token(updated_xid, visitor_id) -> str:
+    # updated_xid: xid8 as text (migration 0009)
+    raw = json.dumps([updated_xid, visitor_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_since_token(token: str):
+    # -> (updated_xid, id), or None for "" (first sync) and for tokens from
+    # before migration 0009 ([updated_at, id]: full resync); ValueError if
+    # garbage
+    if not token or token == "0":
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        updated_xid, visitor_id = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(updated_xid, str) and "T" in updated_xid:
+            datetime.fromisoformat(updated_xid)
+            return None
+        if not str(updated_xid).isdigit():
+            raise ValueError(updated_xid)
+        return str(updated_xid), int(visitor_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError("invalid since token") from e
+
+
+def visitor_list_sql(fields, where=(), limit_sql=""):
+    # /api/admin/visitors and /api/dep/visitors: newest visit first, the
+    # order of visitors_list_order_idx (also planned by check_query_plans.py)
+    return f"""
+        select
+            {visitor_columns(fields)}
+        from public.visitors
+        {"where " + " and ".join(where) if where else ""}
+        order by visit_date desc, visit_time desc, id desc
+        {limit_sql}
+    """
+
+
+def visitor_changes_response(since, department=None):
+    # Rows inserted/changed after the token, in transaction id order, plus
+    # the token for the next call. Changes from transaction ids at or past
+    # the snapshot's xmin are held back: an older transaction may still be
+    # running and commit a row that would otherwise land behind the token.
+    try:
+        after = decode_since_token(since)
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid since token"}), 400
+
+    try:
+        page_size = min(max(int(request.args.get("limit") or VISITORS_MAX_PAGE_SIZE), 1), VISITORS_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid limit"}), 400
+
+    # id is needed for next_since (with updated_xid, selected separately)
+    try:
+        fields = project_fields(request.args.get("fields"), VISITOR_LIST_FIELDS, ("id",))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    where = ["updated_xid < pg_snapshot_xmin(pg_current_snapshot())"]
+    params = []
+    if after:
+        where.append("(updated_xid, id) > (%s::xid8, %s)")
+        params.extend(after)
+    if department:
+        where.append("department = %s")
+        params.append(department)
+    params.append(page_size + 1)
+
+    rows = fetchall(f"""
+        select
+            {visitor_columns(fields)},
+            updated_xid::text as _sync_xid
+        from public.visitors
+        where {" and ".join(where)}
+        order by updated_xid, id
+        limit %s
+    """, tuple(params), row_factory=json_row)
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    next_since = encode_since_token(rows[-1]["_sync_xid"], rows[-1]["id"]) if rows else since
+    for row in rows:
+        del row["_sync_xid"]
+
+    return jsonify({
+        "success": True,
+        "visitors": rows,
+        "next_since": next_since,
+        "has_more": has_more
+    })
+
+
+def etag_json(version, build):
+    # Conditional GET for polled endpoints. `version` must change whenever
+    # the response would; build() is only called when the client's copy
+    # (If-None-Match) is stale.
+    etag = hashlib.sha1(repr((request.full_path, version)).encode()).hexdigest()
+
+    # weak match: compress_response() weakens the tag of compressed bodies
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(build())
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
 def upload_id_to_supabase(file):
     if not file or not file.filename:
         return None
@@ -571,47 +1171,31 @@ def send_verification():
                 message="⚠️ Visiting hours are only from 9:00 AM to 4:00 PM. Please select a valid time."
             )
 
+    # The three checks below are independent, so they run concurrently
+    exists, count_row, blocked = db_async.gather(
+        db_async.fetchone_named("duplicate_appointment", (name, visit_date, visit_time)),
+        db_async.fetchone_named("approved_count_for_date", (visit_date,)),
+        db_async.fetchone_named("disabled_date_probe", (visit_date,)),
+    )
+
     # ✅ Duplicate appointment check in SUPABASE
     # (same name + date + time)
-    exists = fetchone("""
-        select id
-        from public.visitors
-        where name = %s
-          and visit_date = %s
-          and visit_time = %s
-        limit 1
-    """, (name, visit_date, visit_time))
-
     if exists:
         return render_template(
             'Error.html',
             message="⚠️ You already have an appointment for this date and time."
         )
 
-    # ✅ DAILY LIMIT CHECK (max 5 visitors per date)
-    count_row = fetchone("""
-        select count(*) as total
-        from public.visitors
-        where visit_date = %s
-        and status = 'Approved'
-    """, (visit_date,))
-
+    # ✅ DAILY LIMIT CHECK (max DAILY_VISITOR_LIMIT visitors per date)
     current_count = int(count_row["total"]) if count_row and count_row["total"] is not None else 0
 
-    if current_count >= 5:
+    if current_count >= DAILY_VISITOR_LIMIT:
         return render_template(
             "Error.html",
-            message="⚠️ This date already has 5 approved visitors. Please choose another date."
+            message=f"⚠️ This date already has {DAILY_VISITOR_LIMIT} approved visitors. Please choose another date."
         )
 
     # 🚫 DISABLED DATE CHECK
-    blocked = fetchone("""
-        select 1
-        from public.disabled_dates
-        where date = %s
-        limit 1
-    """, (visit_date,))
-
     if blocked:
         return render_template(
             "Error.html",
@@ -722,49 +1306,52 @@ def verify_otp():
         return render_template('Error.html', message="❌ Session expired. Please submit the appointment form again.")
 
     try:
-        # ✅ Insert into SUPABASE (public.visitors) and get the new ID
-        row = fetchone("""
-            insert into public.visitors
-                (name, reason, person_to_visit, department,
-                 visit_date, visit_time, email, valid_id,
-                 status, is_verified)
-            values
-                (%s, %s, %s, %s,
-                 %s, %s, %s, %s,
-                 'Pending', true)
-            returning id
-        """, (
-            visitor_info['name'],
-            visitor_info['reason'],
-            visitor_info['person_to_visit'],
-            visitor_info['department'],
-            visitor_info['visit_date'],   # 'YYYY-MM-DD' ok
-            visitor_info['visit_time'],   # 'HH:MM' ok
-            contact_value,
-            filename
-        ))
+        # Visitor row + admin notification are committed together
+        with transaction():
+            # ✅ Insert into SUPABASE (public.visitors) and get the new ID
+            row = fetchone("""
+                insert into public.visitors
+                    (name, reason, person_to_visit, department,
+                     visit_date, visit_time, email, valid_id,
+                     status, is_verified)
+                values
+                    (%s, %s, %s, %s,
+                     %s, %s, %s, %s,
+                     'Pending', true)
+                returning id
+            """, (
+                visitor_info['name'],
+                visitor_info['reason'],
+                visitor_info['person_to_visit'],
+                visitor_info['department'],
+                visitor_info['visit_date'],   # 'YYYY-MM-DD' ok
+                visitor_info['visit_time'],   # 'HH:MM' ok
+                contact_value,
+                filename
+            ))
+
+            visitor_id = row["id"]
+
+            # ✅ Optional: notify admin that there is a new pending appointment
+            add_notification(
+                target_role="admin",
+                title="New Appointment Request",
+                body=build_notif_body_from_fields(
+                    name=visitor_info["name"],
+                    person_to_visit=visitor_info["person_to_visit"],
+                    reason=visitor_info["reason"],
+                    visit_date=visitor_info["visit_date"],
+                    visit_time=visitor_info["visit_time"],
+                    note=None  # Pending has no decision note yet
+                ),
+                type_="PENDING",
+                visitor_id=visitor_id
+            )
 
-        visitor_id = row["id"]
         session["visitor_id"] = int(visitor_id)
         session["contact_method"] = contact_method
         session["contact_value"] = contact_value
 
-        # ✅ Optional: notify admin that there is a new pending appointment
-        add_notification(
-            target_role="admin",
-            title="New Appointment Request",
-            body=build_notif_body_from_fields(
-                name=visitor_info["name"],
-                person_to_visit=visitor_info["person_to_visit"],
-                reason=visitor_info["reason"],
-                visit_date=visitor_info["visit_date"],
-                visit_time=visitor_info["visit_time"],
-                note=None  # Pending has no decision note yet
-            ),
-            type_="PENDING",
-            visitor_id=visitor_id
-        )
-
         # Clear OTP
         session.pop('otp', None)
         session.pop('otp_timestamp', None)
@@ -978,43 +1565,43 @@ def approve_visitor(visitor_id):
     decided_by = session.get("admin", "admin")
     decided_at = datetime.now(ZoneInfo("Asia/Manila"))
 
-    execute("""
-        update public.visitors
-        set status='Approved',
-            decided_by=%s,
-            decided_at=%s
-        where id=%s
-    """, (decided_by, decided_at, visitor_id))
-
-    # ✅ delete old APPROVED/DECLINED notifications FIRST
-    execute("""
-        delete from public.notifications
-        where visitor_id = %s
-          and type in ('APPROVED', 'DECLINED')
-    """, (visitor_id,))
+    # Status change + capacity + notifications in one commit
+    with transaction():
+        current = fetchone("""
+            select visit_date, status
+            from public.visitors
+            where id = %s
+            for update
+        """, (visitor_id,))
 
-    # ✅ create NEW notifications with full details
-    brief = get_visitor_brief(visitor_id)
-    if brief:
-        add_notification(
-            target_role="guard",
-            title="Visitor Approved",
-            body=build_notif_body(brief),
-            type_="APPROVED",
-            visitor_id=visitor_id
-        )
+        if current and current["status"] != "Approved" and not reserve_capacity(current["visit_date"]):
+            return render_template(
+                "Error.html",
+                message=f"⚠️ Limit reached: only {DAILY_VISITOR_LIMIT} approved visitors allowed for this date."
+            )
 
-        add_notification(
-            target_role="dep_head",
-            target_department=brief["department"],
-            title="Visitor Approved",
-            body=build_notif_body(brief),
-            type_="APPROVED",
-            visitor_id=visitor_id
-        )
+        execute("""
+            update public.visitors
+            set status='Approved',
+                decided_by=%s,
+                decided_at=%s
+            where id=%s
+        """, (decided_by, decided_at, visitor_id))
+
+        # ✅ replace old APPROVED/DECLINED notifications with full details
+        brief = get_visitor_brief(visitor_id)
+        if brief:
+            add_notifications(
+                [("guard", None), ("dep_head", brief["department"])],
+                title="Visitor Approved",
+                body=build_notif_body(brief),
+                type_="APPROVED",
+                visitor_id=visitor_id
+            )
+
+        row = fetchone_named("visitor_email", (visitor_id,))
 
-    # Email QR link (same as yours)
-    row = fetchone("select email from public.visitors where id=%s", (visitor_id,))
+    # Email QR link (same as yours), only after the commit
     if row:
         email = row["email"]
         qr_link = f"https://emailandmobileapp.onrender.com/generate_qr/{visitor_id}"
@@ -1043,41 +1630,40 @@ def decline_visitor(visitor_id):
     decided_by = session.get("admin", "admin")
     decided_at = datetime.now(ZoneInfo("Asia/Manila"))
 
-    execute("""
-        update public.visitors
-        set status='Declined',
-            decided_by=%s,
-            decided_at=%s
-        where id=%s
-    """, (decided_by, decided_at, visitor_id))
+    with transaction():
+        current = fetchone("""
+            select visit_date, status
+            from public.visitors
+            where id = %s
+            for update
+        """, (visitor_id,))
 
-    execute("""
-        delete from public.notifications
-        where visitor_id = %s
-          and type in ('APPROVED', 'DECLINED')
-    """, (visitor_id,))
+        # frees the date's slot
+        if current and current["status"] == "Approved":
+            release_capacity(current["visit_date"])
 
-    brief = get_visitor_brief(visitor_id)
-    if brief:
-        add_notification(
-            target_role="guard",
-            title="Visitor Declined",
-            body=build_notif_body(brief),
-            type_="DECLINED",
-            visitor_id=visitor_id
-        )
+        execute("""
+            update public.visitors
+            set status='Declined',
+                decided_by=%s,
+                decided_at=%s
+            where id=%s
+        """, (decided_by, decided_at, visitor_id))
 
-        add_notification(
-            target_role="dep_head",
-            target_department=brief["department"],
-            title="Visitor Declined",
-            body=build_notif_body(brief),
-            type_="DECLINED",
-            visitor_id=visitor_id
-        )
+        # replaces any earlier APPROVED/DECLINED notifications
+        brief = get_visitor_brief(visitor_id)
+        if brief:
+            add_notifications(
+                [("guard", None), ("dep_head", brief["department"])],
+                title="Visitor Declined",
+                body=build_notif_body(brief),
+                type_="DECLINED",
+                visitor_id=visitor_id
+            )
 
-    # email (same as yours)
-    row = fetchone("select email from public.visitors where id=%s", (visitor_id,))
+        row = fetchone_named("visitor_email", (visitor_id,))
+
+    # email (same as yours), only after the commit
     if row:
         email = row["email"]
 
@@ -1099,16 +1685,35 @@ def download_csv():
         return redirect('/admin/login')
 
     filter_type = request.args.get('filter')
+    date_from = (request.args.get('date_from') or '').strip()  # visit_date range, YYYY-MM-DD
+    date_to = (request.args.get('date_to') or '').strip()
 
-    where_sql = ""
+    where = []
+    params = []
     if filter_type == 'week':
-        where_sql = "where created_at >= (now() - interval '7 days')"
+        where.append("created_at >= (now() - interval '7 days')")
     elif filter_type == 'month':
-        where_sql = "where created_at >= (now() - interval '30 days')"
+        where.append("created_at >= (now() - interval '30 days')")
     elif filter_type == 'year':
-        where_sql = "where created_at >= (now() - interval '365 days')"
+        where.append("created_at >= (now() - interval '365 days')")
 
-    rows = fetchall(f"""
+    try:
+        if date_from:
+            datetime.strptime(date_from, "%Y-%m-%d")
+            where.append("visit_date >= %s")
+            params.append(date_from)
+        if date_to:
+            datetime.strptime(date_to, "%Y-%m-%d")
+            where.append("visit_date <= %s")
+            params.append(date_to)
+    except ValueError:
+        return render_template("Error.html", message="⚠️ Invalid date range.")
+
+    where_sql = ("where " + " and ".join(where)) if where else ""
+
+    # Rows are pulled from a server-side cursor while the response streams,
+    # so memory stays flat however many rows are exported.
+    rows = iter_rows(f"""
         select
             id, name, reason, department, person_to_visit,
             visit_date, visit_time, email, valid_id,
@@ -1116,7 +1721,7 @@ def download_csv():
         from public.visitors
         {where_sql}
         order by id desc
-    """)
+    """, tuple(params))
 
     def generate():
         data = io.StringIO()
@@ -1151,7 +1756,10 @@ def download_csv():
             data.seek(0)
             data.truncate(0)
 
-    filename = f"visitors_{filter_type if filter_type else 'all'}.csv"
+    if date_from or date_to:
+        filename = f"visitors_{date_from or 'start'}_to_{date_to or 'end'}.csv"
+    else:
+        filename = f"visitors_{filter_type if filter_type else 'all'}.csv"
     return Response(generate(), mimetype='text/csv',
                     headers={"Content-Disposition": f"attachment; filename={filename}"})
 
@@ -1230,156 +1838,162 @@ def api_login():
 
 
 @app.route('/api/admin/visitors', methods=['GET'])
+@replica_reads
 def api_admin_visitors():
-    today_ph = datetime.now(ZoneInfo("Asia/Manila")).date()
+    department = (request.args.get("department") or "").strip()
 
-    rows = fetchall("""
-        select
-            id,
-            name,
-            reason,
-            department,
-            person_to_visit,
-            visit_date,
-            visit_time,
-            email,
-            valid_id,
-            status,
-            time_in,
-            time_out,
-            created_at,
-            decision_note,
-            decided_by,
-            decided_at
-        from public.visitors
-        order by visit_date desc, visit_time desc, id desc
-    """)
+    # Delta sync: ?since=<next_since> (empty for the first sync)
+    since = request.args.get("since")
+    if since is not None:
+        return visitor_changes_response(since, department or None)
 
-    visitors = []
-    for r in rows:
-        visit_date = r["visit_date"]
-        time_in = r["time_in"]
-
-        derived_status = r["status"]
-
-        if visit_date and visit_date < today_ph:
-            if time_in is not None:
-                derived_status = "Completed"
-            else:
-                derived_status = "No-show"
-
-        visitors.append({
-            "id": r["id"],
-            "name": r["name"],
-            "reason": r["reason"],
-            "department": r["department"],
-            "person_to_visit": r["person_to_visit"],
-            "visit_date": str(visit_date) if visit_date else None,
-            "visit_time": str(r["visit_time"]) if r["visit_time"] else None,
-            "email": r["email"],
-            "valid_id": r["valid_id"],
-            "status": r["status"],                  # original DB status
-            "derived_status": derived_status,       # computed display status
-            "time_in": r["time_in"].isoformat() if r["time_in"] else None,
-            "time_out": r["time_out"].isoformat() if r["time_out"] else None,
-            "created_at": r["created_at"].isoformat() if r["created_at"] else None,
-            "decision_note": r["decision_note"],
-            "decided_by": r["decided_by"],
-            "decided_at": r["decided_at"].isoformat() if r["decided_at"] else None,
-        })
+    # Filters: ?status=Pending,Approved &date_from=YYYY-MM-DD &date_to=YYYY-MM-DD
+    # &department=... &q=<text in name / person to visit / reason>
+    where = []
+    params = []
 
-    return jsonify(visitors)
+    status = [s.strip() for s in (request.args.get("status") or "").split(",") if s.strip()]
+    if status:
+        where.append("status = any(%s)")
+        params.append(status)
 
-@app.route('/api/admin/approve/<int:visitor_id>', methods=['POST'])
-def api_admin_approve(visitor_id):
     try:
-        data = request.get_json(silent=True) or {}
-        note = (data.get("note") or "").strip() or None
-
-        decided_by = "admin"  # later: from auth/session
-        decided_at = datetime.now(ZoneInfo("Asia/Manila"))
-
-        # 🔥 STEP 0: Check if visitor exists + get visit_date + status
-        row = fetchone("""
-            select visit_date, status
-            from public.visitors
-            where id = %s
-        """, (visitor_id,))
-
-        if not row:
-            return jsonify({"success": False, "message": "Visitor not found"}), 404
-
-        visit_date = row["visit_date"]
-        current_status = row["status"]
-
-        # 🔥 STEP 1: Prevent double approval
-        if current_status == "Approved":
-            return jsonify({
-                "success": False,
-                "message": "Visitor is already approved."
-            }), 400
+        for arg, op in (("date_from", ">="), ("date_to", "<=")):
+            value = (request.args.get(arg) or "").strip()
+            if value:
+                where.append(f"visit_date {op} %s")
+                params.append(datetime.strptime(value, "%Y-%m-%d").date())
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid date (use YYYY-MM-DD)"}), 400
+
+    if department:
+        where.append("department = %s")
+        params.append(department)
+
+    q = (request.args.get("q") or "").strip()
+    if q:
+        # substring match, % and _ in the search text are literal
+        pattern = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        where.append(f"{VISITOR_SEARCH_SQL} ilike %s")
+        params.append(f"%{pattern}%")
+
+    # Keyset pagination: ?limit=N[&cursor=<next_cursor>]. Without either
+    # param the full list is returned as before (older app builds).
+    limit_arg = request.args.get("limit")
+    cursor_arg = request.args.get("cursor")
+    paged = limit_arg is not None or cursor_arg is not None
+
+    limit_sql = ""
+    if paged:
+        try:
+            page_size = min(max(int(limit_arg or VISITORS_PAGE_SIZE), 1), VISITORS_MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({"success": False, "message": "Invalid limit"}), 400
+
+        if cursor_arg:
+            try:
+                after = decode_visitor_cursor(cursor_arg)
+            except ValueError:
+                return jsonify({"success": False, "message": "Invalid cursor"}), 400
+
+            # Same order as the ORDER BY below (all desc), served by
+            # visitors_list_order_idx
+            where.append("(visit_date, visit_time, id) < (%s, %s, %s)")
+            params.extend(after)
+
+        # one extra row tells us whether there is a next page
+        limit_sql = "limit %s"
+        params.append(page_size + 1)
+
+    # ?fields=id,name,status,... narrows the columns (see VISITOR_LIST_FIELDS);
+    # the cursor needs the sort keys when paging
+    required = ("id", "visit_date", "visit_time") if paged else ("id",)
+    try:
+        fields = project_fields(request.args.get("fields"), VISITOR_LIST_FIELDS, required)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
 
-        # 🔥 STEP 2: Count approved visitors for that date
-        count_row = fetchone("""
-            select count(*) as total
-            from public.visitors
-            where visit_date = %s
-              and status = 'Approved'
-        """, (visit_date,))
+    query = visitor_list_sql(fields, where, limit_sql)
 
-        current_count = int(count_row["total"]) if count_row else 0
+    if not paged:
+        # Whole table: stream it straight from the cursor
+        return stream_json_array(app, iter_rows(query, tuple(params), row_factory=json_row))
 
-        # 🔥 STEP 3: Enforce limit (5)
-        if current_count >= 5:
-            return jsonify({
-                "success": False,
-                "message": "⚠️ Limit reached: only 5 approved visitors allowed for this date."
-            }), 400
+    rows = fetchall(query, tuple(params), row_factory=json_row)
 
-        # ✅ STEP 4: Approve visitor
-        execute("""
-            update public.visitors
-            set status = 'Approved',
-                decision_note = %s,
-                decided_by = %s,
-                decided_at = %s
-            where id = %s
-        """, (note, decided_by, decided_at, visitor_id))
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_visitor_cursor(rows[-1])
 
-        # ✅ STEP 5: Remove old notifications
-        execute("""
-            delete from public.notifications
-            where visitor_id = %s
-              and type in ('APPROVED', 'DECLINED')
-        """, (visitor_id,))
-
-        # ✅ STEP 6: Create notifications
-        brief = get_visitor_brief(visitor_id)
-        if brief:
-            body_text = build_notif_body(brief)
+    return jsonify({"success": True, "visitors": rows, "next_cursor": next_cursor})
 
-            add_notification(
-                target_role="guard",
-                title="Visitor Approved",
-                body=body_text,
-                type_="APPROVED",
-                visitor_id=visitor_id
-            )
+@app.route('/api/admin/approve/<int:visitor_id>', methods=['POST'])
+def api_admin_approve(visitor_id):
+    try:
+        data = request.get_json(silent=True) or {}
+        note = (data.get("note") or "").strip() or None
 
-            add_notification(
-                target_role="dep_head",
-                target_department=brief["department"],
-                title="Visitor Approved",
-                body=body_text,
-                type_="APPROVED",
-                visitor_id=visitor_id
-            )
+        decided_by = "admin"  # later: from auth/session
+        decided_at = datetime.now(ZoneInfo("Asia/Manila"))
 
-        # ✅ STEP 7: Send email
-        row_email = fetchone(
-            "select email from public.visitors where id = %s",
-            (visitor_id,)
-        )
+        # Steps 0-7 share one connection and one commit; the visitor row is
+        # locked so two admins can't approve the same visitor at once.
+        with transaction():
+            # 🔥 STEP 0: Check if visitor exists + get visit_date + status
+            row = fetchone("""
+                select visit_date, status
+                from public.visitors
+                where id = %s
+                for update
+            """, (visitor_id,))
+
+            if not row:
+                return jsonify({"success": False, "message": "Visitor not found"}), 404
+
+            visit_date = row["visit_date"]
+            current_status = row["status"]
+
+            # 🔥 STEP 1: Prevent double approval
+            if current_status == "Approved":
+                return jsonify({
+                    "success": False,
+                    "message": "Visitor is already approved."
+                }), 400
+
+            # 🔥 STEP 2-3: Take a slot for that date (daily_capacity), or
+            # stop if DAILY_VISITOR_LIMIT is reached
+            if not reserve_capacity(visit_date):
+                return jsonify({
+                    "success": False,
+                    "message": f"⚠️ Limit reached: only {DAILY_VISITOR_LIMIT} approved visitors allowed for this date."
+                }), 400
+
+            # ✅ STEP 4: Approve visitor
+            execute("""
+                update public.visitors
+                set status = 'Approved',
+                    decision_note = %s,
+                    decided_by = %s,
+                    decided_at = %s
+                where id = %s
+            """, (note, decided_by, decided_at, visitor_id))
+
+            # ✅ STEP 5-6: Create notifications (replaces old APPROVED/DECLINED ones)
+            brief = get_visitor_brief(visitor_id)
+            if brief:
+                body_text = build_notif_body(brief)
+
+                add_notifications(
+                    [("guard", None), ("dep_head", brief["department"])],
+                    title="Visitor Approved",
+                    body=body_text,
+                    type_="APPROVED",
+                    visitor_id=visitor_id
+                )
+
+            # ✅ STEP 7: Send email
+            row_email = fetchone_named("visitor_email", (visitor_id,))
 
         if not row_email:
             return jsonify({"success": False, "message": "Visitor not found"}), 404
@@ -1421,64 +2035,57 @@ def api_admin_decline(visitor_id):
         decided_by = "admin"  # later from auth token/session
         decided_at = datetime.now(ZoneInfo("Asia/Manila"))  # timestamptz
 
-        # 1) Update visitor decision
-        execute("""
-            update public.visitors
-            set
-                status = 'Declined',
-                decision_note = %s,
-                decided_by = %s,
-                decided_at = %s
-            where id = %s
-        """, (
-            note if note else None,
-            decided_by,
-            decided_at,
-            visitor_id
-        ))
-
-        # 2) Remove old decision notifications for this visitor
-        execute("""
-            delete from public.notifications
-            where visitor_id = %s
-              and type in ('APPROVED','DECLINED')
-        """, (visitor_id,))
-
-        # 3) Get email
-        row = fetchone("""
-            select email
-            from public.visitors
-            where id = %s
-        """, (visitor_id,))
+        # 0)-3) share one connection and one commit
+        with transaction():
+            # 0) Lock the visitor; declining an approved visit frees its slot
+            current = fetchone("""
+                select visit_date, status
+                from public.visitors
+                where id = %s
+                for update
+            """, (visitor_id,))
+
+            if current and current["status"] == "Approved":
+                release_capacity(current["visit_date"])
+
+            # 1) Update visitor decision
+            execute("""
+                update public.visitors
+                set
+                    status = 'Declined',
+                    decision_note = %s,
+                    decided_by = %s,
+                    decided_at = %s
+                where id = %s
+            """, (
+                note if note else None,
+                decided_by,
+                decided_at,
+                visitor_id
+            ))
+
+            # 2) Get email
+            row = fetchone_named("visitor_email", (visitor_id,))
+
+            # 3) Create DECLINED notifications (replaces old decision ones)
+            brief = get_visitor_brief(visitor_id)
+            if brief:
+                body_text = build_notif_body(brief)
+
+                add_notifications(
+                    [("guard", None), ("dep_head", brief["department"])],
+                    title="Visitor Declined",
+                    body=body_text,
+                    type_="DECLINED",
+                    visitor_id=visitor_id
+                )
 
         if not row:
             return jsonify({"success": False, "message": "Visitor not found"}), 404
 
         email = row["email"]
 
-        # 4) Create DECLINED notifications
-        brief = get_visitor_brief(visitor_id)
-        if brief:
-            body_text = build_notif_body(brief)
-
-            add_notification(
-                target_role="guard",
-                title="Visitor Declined",
-                body=body_text,
-                type_="DECLINED",
-                visitor_id=visitor_id
-            )
-
-            add_notification(
-                target_role="dep_head",
-                target_department=brief["department"],
-                title="Visitor Declined",
-                body=body_text,
-                type_="DECLINED",
-                visitor_id=visitor_id
-            )
-
-        # 5) Email (include note)
+        # 4) Email (include note)
         subject = "Visit Declined - La Concepcion College"
 
         message_body = "We are sorry, your visit request was DECLINED."
@@ -1599,245 +2206,155 @@ def api_admin_accounts_delete(account_id):
 
 #------------------Dept api----------------
 @app.route('/api/dep/visitors', methods=['GET'])
+@replica_reads
 def api_dep_visitors():
     department = request.args.get("department")
     if not department:
         return jsonify({"success": False, "message": "Missing department"}), 400
 
-    today_ph = datetime.now(ZoneInfo("Asia/Manila")).date()
+    # Delta sync: ?since=<next_since> (empty for the first sync)
+    since = request.args.get("since")
+    if since is not None:
+        return visitor_changes_response(since, department)
 
-    rows = fetchall("""
-        select
-            id, name, reason, department, person_to_visit,
-            visit_date, visit_time, email, valid_id, status,
-            time_in, time_out, created_at, decision_note, decided_by, decided_at
-        from public.visitors
-        where department = %s
-        order by visit_date desc, visit_time desc, id desc
-    """, (department,))
+    try:
+        fields = project_fields(request.args.get("fields"), VISITOR_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
 
-    visitors = []
-    for r in rows:
-        visit_date = r["visit_date"]
-        time_in = r["time_in"]
-
-        derived_status = r["status"]
-
-        if visit_date and visit_date < today_ph:
-            if time_in is not None:
-                derived_status = "Completed"
-            else:
-                derived_status = "No-show"
-
-        visitors.append({
-            "id": r["id"],
-            "name": r["name"],
-            "reason": r["reason"],
-            "department": r["department"],
-            "person_to_visit": r["person_to_visit"],
-            "visit_date": str(visit_date) if visit_date else None,
-            "visit_time": str(r["visit_time"]) if r["visit_time"] else None,
-            "email": r["email"],
-            "valid_id": r["valid_id"],
-            "status": r["status"],
-            "derived_status": derived_status,
-            "time_in": r["time_in"].isoformat() if r["time_in"] else None,
-            "time_out": r["time_out"].isoformat() if r["time_out"] else None,
-            "created_at": r["created_at"].isoformat() if r["created_at"] else None,
-            "decision_note": r["decision_note"],
-            "decided_by": r["decided_by"],
-            "decided_at": r["decided_at"].isoformat() if r["decided_at"] else None,
-        })
+    rows = iter_rows(visitor_list_sql(fields, ["department = %s"]), (department,), row_factory=json_row)
 
-    return jsonify({"success": True, "visitors": visitors})
+    return stream_json_array(app, rows, "visitors", success=True)
 
 # ---------------- GUARD API ----------------
 
 @app.route('/api/guard/visitor/<int:visitor_id>', methods=['GET'])
 def api_guard_get_visitor(visitor_id):
-    row = fetchone("""
+    # Dates/times come back as ISO strings for Android (json_row)
+    row = fetchone(f"""
         select
-            id, name, reason, person_to_visit, department,
-            visit_date, visit_time, email, valid_id,
-            time_in, time_out, status, created_at,
-            decision_note, decided_by, decided_at
+            {visitor_columns(GUARD_VISITOR_FIELDS)}
         from public.visitors
         where id = %s
-    """, (visitor_id,))
+    """, (visitor_id,), row_factory=json_row)
 
     if not row:
         return jsonify({"success": False, "message": "Visitor not found"}), 404
 
-    # Convert date/time/timestamptz safely to strings for Android
-    def s(x):
-        return x.isoformat() if hasattr(x, "isoformat") and x is not None else x
-
-    return jsonify({
-        "success": True,
-        "visitor": {
-            "id": row["id"],
-            "name": row["name"],
-            "reason": row["reason"],
-            "person_to_visit": row["person_to_visit"],
-            "department": row["department"],
-            "visit_date": s(row["visit_date"]),       # date -> "YYYY-MM-DD"
-            "visit_time": s(row["visit_time"]),       # time -> "HH:MM:SS"
-            "email": row["email"],
-            "valid_id": row["valid_id"],
-            "time_in": s(row["time_in"]),             # timestamptz -> ISO string
-            "time_out": s(row["time_out"]),
-            "status": row["status"],
-            "created_at": s(row["created_at"]),
-            "decision_note": row["decision_note"],
-            "decided_by": row["decided_by"],
-            "decided_at": s(row["decided_at"]),
-        }
-    })
+    return jsonify({"success": True, "visitor": row})
 
 @app.route('/api/guard/scan/<int:visitor_id>', methods=['POST'])
 def api_guard_scan(visitor_id):
-    # 1) Read visitor
-    row = fetchone("""
-        select
-            id, name, department, person_to_visit,
-            visit_date, visit_time, status, time_in, time_out
-        from public.visitors
-        where id = %s
-    """, (visitor_id,))
-
-    if not row:
-        return jsonify({"success": False, "message": "Visitor not found"}), 404
-
-    vid = row["id"]
-    name = row["name"]
-    vdate = row["visit_date"]
-    status = row["status"]
-    time_in = row["time_in"]
-    time_out = row["time_out"]
-
-    # Status must be Approved
-    if status != "Approved":
-        return jsonify({"success": False, "message": f"Not allowed: status is {status}"}), 403
-
-    # Appointment date must be today (Manila)
-    today_ph = datetime.now(ZoneInfo("Asia/Manila")).date()
-    if vdate != today_ph:
-        return jsonify({
-            "success": False,
-            "message": f"Not allowed: appointment date is {vdate}"
-        }), 403
-
-    # Current actual scan time
-    now_dt = datetime.now(ZoneInfo("Asia/Manila"))
-    actual_time = now_dt.strftime("%Y-%m-%d %H:%M:%S")
-
-    # If no time_in yet → TIME IN
-    if time_in is None:
-        execute("""
-            update public.visitors
-            set time_in = %s
+    # Read + time_in/time_out update + notifications in one commit. The row
+    # lock stops a double scan from recording two time-ins.
+    with transaction():
+        # 1) Read visitor
+        row = fetchone("""
+            select
+                id, name, department, person_to_visit,
+                visit_date, visit_time, status, time_in, time_out
+            from public.visitors
             where id = %s
-        """, (now_dt, vid))
-
-        brief = get_visitor_brief(vid)
-        if brief:
-            body_text = build_guard_scan_body(brief, "TIME_IN", actual_time)
-
-            add_notification(
-                target_role="admin",
-                title="Visitor Arrived",
-                body=body_text,
-                type_="TIME_IN",
-                visitor_id=vid
-            )
+            for update
+        """, (visitor_id,))
 
-            add_notification(
-                target_role="dep_head",
-                target_department=brief["department"],
-                title="Visitor Arrived",
-                body=body_text,
-                type_="TIME_IN",
-                visitor_id=vid
-            )
+        if not row:
+            return jsonify({"success": False, "message": "Visitor not found"}), 404
 
-        return jsonify({
-            "success": True,
-            "action": "TIME_IN",
-            "message": f"Time-in recorded for {name}",
-            "time": now_dt.isoformat()
-        })
+        vid = row["id"]
+        name = row["name"]
+        vdate = row["visit_date"]
+        status = row["status"]
+        time_in = row["time_in"]
+        time_out = row["time_out"]
 
-    # If time_in exists but no time_out yet → TIME OUT
-    if time_in is not None and time_out is None:
-        execute("""
-            update public.visitors
-            set time_out = %s
-            where id = %s
-        """, (now_dt, vid))
+        # Status must be Approved
+        if status != "Approved":
+            return jsonify({"success": False, "message": f"Not allowed: status is {status}"}), 403
 
-        brief = get_visitor_brief(vid)
-        if brief:
-            body_text = build_guard_scan_body(brief, "TIME_OUT", actual_time)
+        # Appointment date must be today (Manila)
+        today_ph = datetime.now(ZoneInfo("Asia/Manila")).date()
+        if vdate != today_ph:
+            return jsonify({
+                "success": False,
+                "message": f"Not allowed: appointment date is {vdate}"
+            }), 403
+
+        # Current actual scan time
+        now_dt = datetime.now(ZoneInfo("Asia/Manila"))
+        actual_time = now_dt.strftime("%Y-%m-%d %H:%M:%S")
+
+        # If no time_in yet → TIME IN
+        if time_in is None:
+            execute("""
+                update public.visitors
+                set time_in = %s
+                where id = %s
+            """, (now_dt, vid))
+
+            brief = get_visitor_brief(vid)
+            if brief:
+                body_text = build_guard_scan_body(brief, "TIME_IN", actual_time)
+
+                add_notifications(
+                    [("admin", None), ("dep_head", brief["department"])],
+                    title="Visitor Arrived",
+                    body=body_text,
+                    type_="TIME_IN",
+                    visitor_id=vid
+                )
 
-            add_notification(
-                target_role="admin",
-                title="Visitor Left",
-                body=body_text,
-                type_="TIME_OUT",
-                visitor_id=vid
-            )
+            return jsonify({
+                "success": True,
+                "action": "TIME_IN",
+                "message": f"Time-in recorded for {name}",
+                "time": now_dt.isoformat()
+            })
+
+        # If time_in exists but no time_out yet → TIME OUT
+        if time_in is not None and time_out is None:
+            execute("""
+                update public.visitors
+                set time_out = %s
+                where id = %s
+            """, (now_dt, vid))
+
+            brief = get_visitor_brief(vid)
+            if brief:
+                body_text = build_guard_scan_body(brief, "TIME_OUT", actual_time)
+
+                add_notifications(
+                    [("admin", None), ("dep_head", brief["department"])],
+                    title="Visitor Left",
+                    body=body_text,
+                    type_="TIME_OUT",
+                    visitor_id=vid
+                )
 
-            add_notification(
-                target_role="dep_head",
-                target_department=brief["department"],
-                title="Visitor Left",
-                body=body_text,
-                type_="TIME_OUT",
-                visitor_id=vid
-            )
+            return jsonify({
+                "success": True,
+                "action": "TIME_OUT",
+                "message": f"Time-out recorded for {name}",
+                "time": now_dt.isoformat()
+            })
 
+        # Already completed
         return jsonify({
-            "success": True,
-            "action": "TIME_OUT",
-            "message": f"Time-out recorded for {name}",
-            "time": now_dt.isoformat()
-        })
-
-    # Already completed
-    return jsonify({
-        "success": False,
-        "message": "Visitor already timed out (visit completed)."
-    }), 409
+            "success": False,
+            "message": "Visitor already timed out (visit completed)."
+        }), 409
 
 @app.route("/api/guard/today", methods=["GET"])
+@replica_reads
 def api_guard_today():
     today_ph = datetime.now(ZoneInfo("Asia/Manila")).date()
 
-    rows = fetchall("""
-        select
-            id, name, reason, department, person_to_visit,
-            visit_date, visit_time, email, status, time_in, time_out
-        from public.visitors
-        where status = 'Approved'
-          and visit_date = %s
-        order by visit_time asc
-    """, (today_ph,))
+    row = fetchone_named("guard_today_version", (today_ph,))
+    return etag_json((today_ph, row["total"], row["version"]), lambda: build_guard_today(today_ph))
 
-    visitors = []
-    for r in rows:
-        visitors.append({
-            "id": r["id"],
-            "name": r["name"],
-            "reason": r["reason"],
-            "department": r["department"],
-            "person_to_visit": r["person_to_visit"],
-            "visit_date": str(r["visit_date"]),
-            "visit_time": str(r["visit_time"]),
-            "email": r["email"],
-            "status": r["status"],
-            "time_in": r["time_in"].isoformat() if r["time_in"] else None,
-            "time_out": r["time_out"].isoformat() if r["time_out"] else None
-        })
+
+def build_guard_today(today_ph):
+    visitors = fetchall_named("guard_today", (today_ph,), row_factory=json_row)
 
     return jsonify({
         "success": True,
@@ -1847,6 +2364,7 @@ def api_guard_today():
     })
 
 @app.route("/api/notifications", methods=["GET"])
+@replica_reads
 def api_get_notifications():
     role = request.args.get("role")
     department = request.args.get("department")
@@ -1857,59 +2375,202 @@ def api_get_notifications():
     if not role:
         return jsonify({"success": False, "message": "Missing role"}), 400
 
+    try:
+        limit = min(max(int(request.args.get("limit") or NOTIFICATIONS_PAGE_SIZE), 1), NOTIFICATIONS_MAX_PAGE_SIZE)
+        before_id = request.args.get("before_id")
+        before_id = int(before_id) if before_id else None
+        after_id = request.args.get("after_id")
+        after_id = int(after_id) if after_id else None
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid limit / before_id / after_id"}), 400
+
+    query_name, params = notification_scope(role, department)
+    # unread_count covers all rows, not only the page
+    unread = fetchone_named(f"{query_name}_unread", params)["unread"]
+
+    # Paging: ?before_id=<smallest id seen> for older rows (newest first),
+    # ?after_id=<largest id seen> for newer rows (oldest first)
+    if before_id is not None or after_id is not None:
+        if before_id is not None:
+            rows = fetchall_named(f"{query_name}_before", params + (before_id, limit + 1))
+        else:
+            rows = fetchall_named(f"{query_name}_since", params + (after_id, limit + 1))
+
+        return jsonify({
+            "success": True,
+            "notifications": [notification_to_dict(r) for r in rows[:limit]],
+            "unread_count": unread,
+            "has_more": len(rows) > limit
+        })
+
+    version = fetchone_named(f"{query_name}_version", params + (limit,))["version"]
+    return etag_json((version, unread), lambda: build_notifications(query_name, params + (limit,), unread))
+
+
+@app.route("/api/notifications/unread-count", methods=["GET"])
+@replica_reads
+def api_notifications_unread_count():
+    # Badge refresh: reads the counter rows only
+    role = request.args.get("role")
+    department = request.args.get("department")
+
+    if department is not None and department.strip() == "":
+        department = None
+
+    if not role:
+        return jsonify({"success": False, "message": "Missing role"}), 400
+
+    query_name, params = notification_scope(role, department)
+    unread = fetchone_named(f"{query_name}_unread", params)["unread"]
+    return etag_json(unread, lambda: jsonify({"success": True, "unread_count": unread}))
+
+
+def is_dep_head_department(department) -> bool:
+    # Only departments with a dep_head account in public.admin_accounts (the
+    # accounts /api/login signs in) can open a department notification stream
+    return fetchone_named("dep_head_department_probe", (department,)) is not None
+
+
+def notification_scope(role, department):
+    # -> (NOTIFICATION_SCOPES query name, params) for a client
     if role == "dep_head":
         if department:
-            rows = fetchall("""
-                select id, target_role, target_department, title, body, type, visitor_id, created_at, is_read
-                from public.notifications
-                where target_role = %s
-                  and (target_department = %s or target_department is null)
-                order by id desc
-                limit 100
-            """, (role, department))
-        else:
-            rows = fetchall("""
-                select id, target_role, target_department, title, body, type, visitor_id, created_at, is_read
-                from public.notifications
-                where target_role = %s
-                  and target_department is null
-                order by id desc
-                limit 100
-            """, (role,))
-    else:
-        rows = fetchall("""
-            select id, target_role, target_department, title, body, type, visitor_id, created_at, is_read
-            from public.notifications
-            where target_role = %s
-            order by id desc
-            limit 100
-        """, (role,))
+            return "notifications_for_department", (role, department)
+        return "notifications_unassigned", (role,)
+    return "notifications_for_role", (role,)
 
-    notifications = []
-    unread_count = 0
 
-    for r in rows:
-        is_read = bool(r["is_read"])
-        if not is_read:
-            unread_count += 1
-
-        notifications.append({
-            "id": r["id"],
-            "target_role": r["target_role"],
-            "target_department": r["target_department"],
-            "title": r["title"],
-            "body": r["body"],
-            "type": r["type"],
-            "visitor_id": r["visitor_id"],
-            "created_at": r["created_at"].isoformat() if r["created_at"] else None,
-            "is_read": 1 if is_read else 0
-        })
+def notification_to_dict(r) -> dict:
+    return {
+        "id": r["id"],
+        "target_role": r["target_role"],
+        "target_department": r["target_department"],
+        "title": r["title"],
+        "body": r["body"],
+        "type": r["type"],
+        "visitor_id": r["visitor_id"],
+        "created_at": r["created_at"].isoformat() if r["created_at"] else None,
+        "is_read": 1 if r["is_read"] else 0
+    }
+
+
+def build_notifications(query_name, params, unread_count):
+    rows = fetchall_named(query_name, params)
+
+    notifications = [notification_to_dict(r) for r in rows]
 
     return jsonify({"success": True, "notifications": notifications, "unread_count": unread_count})
 
+
+@app.route("/api/notifications/stream", methods=["GET"])
+def api_notifications_stream():
+    # Server-Sent Events: every new notification for role (+ department) is
+    # pushed as one event with id = notification id. On reconnect the
+    # browser/client sends Last-Event-ID (or ?last_event_id=) and the rows
+    # it missed are replayed from the database first.
+    role = request.args.get("role")
+    department = request.args.get("department")
+
+    if department is not None and department.strip() == "":
+        department = None
+
+    if not role:
+        return jsonify({"success": False, "message": "Missing role"}), 400
+
+    # Every stream LISTENs on a channel named after its scope: only real
+    # roles and departments, so clients can't make the listener pile up
+    # arbitrary channels
+    if role not in NOTIFICATION_ROLES:
+        return jsonify({"success": False, "message": "Invalid role"}), 400
+    if role != "dep_head":
+        department = None
+    elif department and not is_dep_head_department(department):
+        return jsonify({"success": False, "message": "Unknown department"}), 400
+
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid Last-Event-ID"}), 400
+
+    # LISTEN (this worker) and subscribe before reading the backlog so
+    # nothing committed in between is lost (rows already replayed from the
+    # backlog are skipped)
+    channels = [notification_channel(role)]
+    if department:
+        channels.append(notification_channel(role, department))
+    for channel in channels:
+        db_listen.listen(channel, dispatch_notification)
+    sub = notification_hub.subscribe(role, department)
+    query_name, params = notification_scope(role, department)
+
+    closed = []
+
+    def close_stream():
+        # From the generator's finally and from the response's close() (a
+        # generator closed before its first chunk never runs its finally)
+        if closed:
+            return
+        closed.append(True)
+        sub.close()
+        for channel in channels:
+            db_listen.unlisten(channel, dispatch_notification)
+
+    def backlog_page(after_id):
+        return fetchall_named(f"{query_name}_since", params + (after_id, NOTIFICATIONS_PAGE_SIZE))
+
+    # First backlog page in the view, so a failing query is a normal error
+    try:
+        backlog = backlog_page(last_id) if last_id is not None else []
+    except Exception:
+        close_stream()
+        raise
+
+    def event(row):
+        return f"id: {row['id']}\ndata: {app.json.dumps(notification_to_dict(row))}\n\n"
+
+    def generate():
+        # Ids commit out of order (overlapping transactions, the decision
+        # upsert's new id), so live rows are checked against the replayed
+        # ids rather than against the highest id sent
+        replayed = set()
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        try:
+            yield "retry: 5000\n\n"
+
+            # Replay everything missed, page by page until a short page
+            page = backlog
+            while page:
+                for row in page:
+                    replayed.add(row["id"])
+                    yield event(row)
+                if len(page) < NOTIFICATIONS_PAGE_SIZE:
+                    break
+                page = backlog_page(page[-1]["id"])
+
+            while time.monotonic() < deadline:
+                rows = sub.wait(SSE_KEEPALIVE_SECONDS)
+                if rows is None:
+                    break  # fell behind: client reconnects and resumes
+                if not rows:
+                    yield ": keepalive\n\n"
+                    continue
+                for row in rows:
+                    if row["id"] not in replayed:
+                        yield event(row)
+        finally:
+            close_stream()
+
+    response = Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    response.call_on_close(close_stream)
+    return response
+
 @app.route("/api/notifications/read/<int:notif_id>", methods=["POST"])
 def api_mark_notification_read(notif_id):
-    execute("update public.notifications set is_read = true where id = %s", (notif_id,))
+    execute("update public.notifications set is_read = true where id = %s and is_read = false", (notif_id,))
     return jsonify({"success": True})
 
 @app.route("/api/notifications/read_all", methods=["POST"])
@@ -1927,12 +2588,14 @@ def api_mark_all_read():
             set is_read = true
             where target_role = %s
               and (target_department = %s or target_department is null)
+              and is_read = false
         """, (role, department))
     else:
         execute("""
             update public.notifications
             set is_read = true
             where target_role = %s
+              and is_read = false
         """, (role,))
 
     return jsonify({"success": True})
@@ -1942,14 +2605,21 @@ def api_mark_all_read():
 def health_db():
     try:
         row = fetchone("select now() as now")
-        return jsonify(success=True, now=str(row["now"]))
+        return jsonify(success=True, now=str(row["now"]), dns=dns_stats(), replica=replica_status())
     except Exception as e:
         return jsonify(success=False, error=str(e)), 500
 
 
+@app.get("/api/health/queries")
+def health_queries():
+    # Per named-query execution counts and timings for this worker
+    return jsonify(success=True, queries=query_stats())
+
+
 
 
 @app.route('/api/premises-status', methods=['GET'])
+@replica_reads
 def api_premises_status():
     role = request.args.get("role")
     department = request.args.get("department")
@@ -1959,66 +2629,33 @@ def api_premises_status():
 
     today_ph = datetime.now(ZoneInfo("Asia/Manila")).date()
 
-    params_inside = []
-    params_left = [today_ph]
-
-    where_inside = "where time_in is not null and time_out is null"
-    where_left = "where time_out is not null and visit_date = %s"
-
     # dep_head sees only their own department
     if role == "dep_head":
         if not department:
             return jsonify({"success": False, "message": "Missing department"}), 400
+    else:
+        department = None
 
-        where_inside += " and department = %s"
-        where_left += " and department = %s"
-        params_inside.append(department)
-        params_left.append(department)
+    if department:
+        row = fetchone_named("premises_version_department", (department, today_ph, department))
+    else:
+        row = fetchone_named("premises_version", (today_ph,))
+    return etag_json(
+        (today_ph, row["total"], row["version"]),
+        lambda: build_premises_status(today_ph, department)
+    )
 
-    inside_rows = fetchall(f"""
-        select
-            id, name, department, person_to_visit,
-            reason, visit_date, visit_time, time_in
-        from public.visitors
-        {where_inside}
-        order by time_in desc
-    """, tuple(params_inside))
 
-    left_rows = fetchall(f"""
-        select
-            id, name, department, person_to_visit,
-            reason, visit_date, visit_time, time_out
-        from public.visitors
-        {where_left}
-        order by time_out desc
-        limit 100
-    """, tuple(params_left))
-
-    inside = []
-    for r in inside_rows:
-        inside.append({
-            "id": r["id"],
-            "name": r["name"],
-            "department": r["department"],
-            "person_to_visit": r["person_to_visit"],
-            "reason": r["reason"],
-            "visit_date": str(r["visit_date"]) if r["visit_date"] else None,
-            "visit_time": str(r["visit_time"]) if r["visit_time"] else None,
-            "time_in": r["time_in"].isoformat() if r["time_in"] else None
-        })
+def build_premises_status(today_ph, department=None):
+    # premises_inside / premises_left, the "_department" ones for a dep_head
+    suffix = "_department" if department else ""
+    extra = (department,) if department else ()
 
-    left = []
-    for r in left_rows:
-        left.append({
-            "id": r["id"],
-            "name": r["name"],
-            "department": r["department"],
-            "person_to_visit": r["person_to_visit"],
-            "reason": r["reason"],
-            "visit_date": str(r["visit_date"]) if r["visit_date"] else None,
-            "visit_time": str(r["visit_time"]) if r["visit_time"] else None,
-            "time_out": r["time_out"].isoformat() if r["time_out"] else None
-        })
+    # Both lists are independent, fetch them concurrently
+    inside, left = db_async.gather(
+        db_async.fetchall_named(f"premises_inside{suffix}", extra, row_factory=json_row),
+        db_async.fetchall_named(f"premises_left{suffix}", (today_ph,) + extra, row_factory=json_row),
+    )
 
     return jsonify({
         "success": True,
@@ -2080,12 +2717,12 @@ def api_dep_send_message(visitor_id):
 
 @app.route('/api/full-dates', methods=['GET'])
 def get_full_dates():
-    rows = fetchall("""
-        select visit_date, count(*) as total
-        from public.visitors
-        group by visit_date
-        having count(*) >= 5
-    """)
+    row = fetchone_named("full_dates_version", (DAILY_VISITOR_LIMIT,))
+    return etag_json((row["total"], row["version"]), build_full_dates)
+
+
+def build_full_dates():
+    rows = fetchall_named("full_dates", (DAILY_VISITOR_LIMIT,))
 
     full_dates = [str(r["visit_date"]) for r in rows]
 
@@ -2124,10 +2761,12 @@ def enable_date():
 
 @app.route('/api/disabled-dates', methods=['GET'])
 def get_disabled_dates():
-    rows = fetchall("""
-        select date
-        from public.disabled_dates
-    """)
+    row = fetchone_named("disabled_dates_version")
+    return etag_json((row["total"], row["version"]), build_disabled_dates)
+
+
+def build_disabled_dates():
+    rows = fetchall_named("disabled_dates")
 
     return jsonify({
         "success": True,
@@ -2135,6 +2774,7 @@ def get_disabled_dates():
     })
 
 @app.route('/api/admin/analytics', methods=['GET'])
+@replica_reads
 def admin_analytics():
     mode = request.args.get("mode", "day")
 
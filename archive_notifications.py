@@ -0,0 +1,68 @@
+import os
+import sys
+
+from db import get_conn
+
+# Moves read notifications older than NOTIFICATION_RETENTION_DAYS from
+# public.notifications to public.notifications_archive (migration 0007).
+# Runs in small batches, each its own transaction, so it never holds locks
+# for long; rows being updated by the app are skipped until the next run.
+# Unread rows are never archived. Schedule it daily (e.g. a Render cron job):
+#
+#     python archive_notifications.py            archive
+#     python archive_notifications.py --dry-run  only count what would move
+
+RETENTION_DAYS = int(os.environ.get("NOTIFICATION_RETENTION_DAYS", "90"))
+BATCH_SIZE = int(os.environ.get("NOTIFICATION_ARCHIVE_BATCH", "5000"))
+
+ARCHIVE_BATCH_SQL = """
+    with moved as (
+        delete from public.notifications
+        where id in (
+            select id
+            from public.notifications
+            where is_read
+              and created_at < now() - make_interval(days => %s)
+            order by created_at
+            limit %s
+            for update skip locked
+        )
+        returning *
+    )
+    insert into public.notifications_archive
+    select moved.*, now()
+    from moved
+"""
+
+COUNT_SQL = """
+    select count(*) as total
+    from public.notifications
+    where is_read
+      and created_at < now() - make_interval(days => %s)
+"""
+
+
+def archive(dry_run=False):
+    conn = get_conn()
+    try:
+        if dry_run:
+            row = conn.execute(COUNT_SQL, (RETENTION_DAYS,)).fetchone()
+            print(f"{row['total']} read notifications older than {RETENTION_DAYS} days")
+            return 0
+
+        total = 0
+        while True:
+            with conn.transaction():
+                moved = conn.execute(ARCHIVE_BATCH_SQL, (RETENTION_DAYS, BATCH_SIZE)).rowcount
+            total += moved
+            if moved < BATCH_SIZE:
+                break
+
+        print(f"archived {total} notifications older than {RETENTION_DAYS} days")
+        return total
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    archive(dry_run="--dry-run" in sys.argv[1:])
@@ -0,0 +1,126 @@
+import random
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from zoneinfo import ZoneInfo
+
+from serializers import VISITOR_LIST_FIELDS, json_row
+
+# Micro-benchmark of turning decoded visitor rows into JSON-ready dicts:
+#   before: dict_row + the old hand-written loop (derived_status in Python)
+#   after:  serializers.json_row (derived_status already computed by SQL)
+# Run: python bench_serializers.py [rows]
+
+MANILA = ZoneInfo("Asia/Manila")
+
+
+def make_rows(n):
+    today = date.today()
+    rows = []
+    for i in range(n):
+        visit_date = today + timedelta(days=random.randint(-60, 30))
+        time_in = datetime.now(MANILA) if random.random() < 0.5 else None
+        status = random.choice(["Pending", "Approved", "Declined"])
+        derived = status
+        if visit_date < today:
+            derived = "Completed" if time_in is not None else "No-show"
+        rows.append({
+            "id": i,
+            "name": f"Visitor {i}",
+            "reason": "Enrollment",
+            "department": random.choice(["BSIS", "CRIM", "BSA"]),
+            "person_to_visit": "Registrar",
+            "visit_date": visit_date,
+            "visit_time": dt_time(9 + i % 7, 30),
+            "email": f"v{i}@example.com",
+            "valid_id": f"valid_ids/{i}.jpg",
+            "status": status,
+            "derived_status": derived,
+            "time_in": time_in,
+            "time_out": None,
+            "created_at": datetime.now(MANILA),
+            "decision_note": None,
+            "decided_by": "admin",
+            "decided_at": datetime.now(MANILA),
+            "updated_at": datetime.now(MANILA),
+        })
+    return rows
+
+
+def old_loop(rows, today_ph):
+    visitors = []
+    for r in rows:
+        visit_date = r["visit_date"]
+        time_in = r["time_in"]
+
+        derived_status = r["status"]
+
+        if visit_date and visit_date < today_ph:
+            if time_in is not None:
+                derived_status = "Completed"
+            else:
+                derived_status = "No-show"
+
+        visitors.append({
+            "id": r["id"],
+            "name": r["name"],
+            "reason": r["reason"],
+            "department": r["department"],
+            "person_to_visit": r["person_to_visit"],
+            "visit_date": str(visit_date) if visit_date else None,
+            "visit_time": str(r["visit_time"]) if r["visit_time"] else None,
+            "email": r["email"],
+            "valid_id": r["valid_id"],
+            "status": r["status"],
+            "derived_status": derived_status,
+            "time_in": r["time_in"].isoformat() if r["time_in"] else None,
+            "time_out": r["time_out"].isoformat() if r["time_out"] else None,
+            "created_at": r["created_at"].isoformat() if r["created_at"] else None,
+            "decision_note": r["decision_note"],
+            "decided_by": r["decided_by"],
+            "decided_at": r["decided_at"].isoformat() if r["decided_at"] else None,
+            "updated_at": r["updated_at"].isoformat() if r["updated_at"] else None,
+        })
+    return visitors
+
+
+class _Column:
+    def __init__(self, name):
+        self.name = name
+
+
+class _FakeCursor:
+    # Just enough of a psycopg cursor for a row factory
+    description = [_Column(f) for f in VISITOR_LIST_FIELDS]
+
+
+def before(tuples, today):
+    names = [c.name for c in _FakeCursor.description]
+    return old_loop([dict(zip(names, values)) for values in tuples], today)
+
+
+def after(tuples):
+    make_row = json_row(_FakeCursor())
+    return [make_row(values) for values in tuples]
+
+
+def bench(label, fn, rows, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<18} {len(rows) / best:>12,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    import sys
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rows = make_rows(n)
+    tuples = [tuple(r[f] for f in VISITOR_LIST_FIELDS) for r in rows]
+    today = date.today()
+
+    assert before(tuples, today) == after(tuples)
+
+    bench("before (loop)", lambda: before(tuples, today), rows)
+    bench("after (json_row)", lambda: after(tuples), rows)
@@ -0,0 +1,151 @@
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlparse, urlencode
+
+from notification_hub import NotificationHub
+
+# Benchmark for the notification SSE fan-out with many connected clients.
+#
+#   python bench_sse.py                       in-process: hub + 200 waiting
+#                                             clients, publish latency and
+#                                             idle CPU
+#   python bench_sse.py --url http://127.0.0.1:5000 --seconds 60
+#                                             200 real connections to a
+#                                             running FlaskApp; approve or
+#                                             decline a visitor meanwhile
+#                                             to see the events arrive
+
+KEEPALIVE = 15
+
+
+def bench_in_process(clients, events, idle_seconds):
+    hub = NotificationHub()
+    latencies = []
+    lat_lock = threading.Lock()
+    received = threading.Semaphore(0)
+
+    def client(i):
+        role = "guard" if i % 2 == 0 else "dep_head"
+        department = f"DEPT{i % 10}" if role == "dep_head" else None
+        sub = hub.subscribe(role, department)
+        try:
+            while True:
+                rows = sub.wait(KEEPALIVE)
+                if rows is None:
+                    return
+                now = time.perf_counter()
+                with lat_lock:
+                    latencies.extend(now - row["sent_at"] for row in rows)
+                for _ in rows:
+                    received.release()
+        finally:
+            sub.close()
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    for t in threads:
+        t.start()
+    while hub.count() < clients:
+        time.sleep(0.01)
+
+    # Idle: every client is blocked in wait(), nothing is published
+    cpu = time.process_time()
+    time.sleep(idle_seconds)
+    idle_cpu = time.process_time() - cpu
+
+    # Fan-out: each event goes to all guards + one department's heads
+    expected = 0
+    for n in range(events):
+        department = f"DEPT{n % 10}"
+        sent_at = time.perf_counter()
+        hub.publish([
+            {"id": 2 * n + 1, "target_role": "guard", "target_department": None, "sent_at": sent_at},
+            {"id": 2 * n + 2, "target_role": "dep_head", "target_department": department, "sent_at": sent_at},
+        ])
+        expected += clients // 2 + sum(1 for i in range(1, clients, 2) if i % 10 == n % 10)
+        time.sleep(0.01)
+
+    for _ in range(expected):
+        received.acquire(timeout=5)
+
+    for sub in list(hub.subscriptions):
+        sub.close()
+
+    latencies.sort()
+    print(f"clients            {clients}")
+    print(f"idle CPU           {idle_cpu * 1000:.1f} ms over {idle_seconds}s")
+    print(f"deliveries         {len(latencies)} / {expected}")
+    if latencies:
+        print(f"latency p50        {statistics.median(latencies) * 1000:.2f} ms")
+        print(f"latency p99        {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms")
+
+
+def bench_url(url, clients, seconds):
+    parsed = urlparse(url)
+    stats = {"connected": 0, "failed": 0, "events": 0, "keepalives": 0}
+    connect_times = []
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def client(i):
+        role = "guard" if i % 2 == 0 else "dep_head"
+        query = {"role": role}
+        if role == "dep_head":
+            query["department"] = f"DEPT{i % 10}"
+
+        started = time.perf_counter()
+        try:
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=KEEPALIVE * 2)
+            conn.request("GET", "/api/notifications/stream?" + urlencode(query))
+            response = conn.getresponse()
+            if response.status != 200:
+                raise RuntimeError(response.status)
+            response.readline()  # retry: line
+            with lock:
+                stats["connected"] += 1
+                connect_times.append(time.perf_counter() - started)
+
+            while time.monotonic() < stop:
+                line = response.readline()
+                if not line:
+                    break
+                with lock:
+                    if line.startswith(b"id:"):
+                        stats["events"] += 1
+                    elif line.startswith(b": keepalive"):
+                        stats["keepalives"] += 1
+            conn.close()
+        except Exception as e:
+            with lock:
+                stats["failed"] += 1
+            print("client", i, "failed:", e)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(seconds + KEEPALIVE * 2)
+
+    print(f"clients            {clients}")
+    print(f"connected          {stats['connected']} (failed {stats['failed']})")
+    if connect_times:
+        print(f"connect p50        {statistics.median(connect_times) * 1000:.1f} ms")
+    print(f"events received    {stats['events']}")
+    print(f"keepalives         {stats['keepalives']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--idle", type=float, default=3.0)
+    parser.add_argument("--url")
+    parser.add_argument("--seconds", type=float, default=30.0)
+    args = parser.parse_args()
+
+    if args.url:
+        bench_url(args.url, args.clients, args.seconds)
+    else:
+        bench_in_process(args.clients, args.events, args.idle)
@@ -0,0 +1,133 @@
+import json
+import sys
+from datetime import date, time
+
+# Importing the app registers its named queries
+from FlaskApp import NOTIFICATIONS_PAGE_SIZE, VISITORS_PAGE_SIZE, visitor_list_sql
+from db import _named_query, get_conn
+from serializers import VISITOR_LIST_FIELDS
+
+# EXPLAINs the hot visitor / notification queries and fails (exit 1) if any
+# of them reads public.visitors or public.notifications with a sequential
+# scan, i.e. an index from migrations/ is missing or not usable.
+#
+#     python check_query_plans.py              plans against the current data
+#     python check_query_plans.py --seed 200000
+#
+# --seed inserts that many visitors (and twice as many notifications)
+# before planning. Everything runs in one transaction that is rolled back,
+# but it still writes to the database: use a staging copy, not production.
+
+DEPARTMENTS = 30
+
+SEED_SQL = [
+    f"""
+    insert into public.visitors
+        (name, reason, person_to_visit, department, visit_date, visit_time,
+         email, status, is_verified, created_at, time_in, time_out)
+    select
+        'Seed Visitor ' || g,
+        'Enrollment',
+        'Registrar',
+        'DEPT' || (g %% {DEPARTMENTS}),
+        current_date - (g %% 730),
+        time '08:00' + make_interval(mins => (g %% 540)),
+        'seed' || g || '@example.com',
+        (array['Pending', 'Approved', 'Declined'])[1 + g %% 3],
+        true,
+        now(),
+        -- past visits have left; every 1000th visitor is still inside
+        case when g %% 730 > 0 or g %% 1000 = 0 then now() - interval '3 hours' end,
+        case when g %% 730 > 0 and g %% 1000 > 0 then now() - interval '1 hour' end
+    from generate_series(1, %(rows)s) as g
+    """,
+    f"""
+    insert into public.notifications
+        (target_role, target_department, title, body, type, created_at, is_read)
+    select
+        (array['guard', 'dep_head', 'admin'])[1 + g %% 3],
+        case when g %% 5 = 0 then null else 'DEPT' || (g %% {DEPARTMENTS}) end,
+        'Seed notification',
+        'Seed notification body',
+        'info',
+        now(),
+        g %% 2 = 0
+    from generate_series(1, %(rows)s * 2) as g
+    """,
+]
+
+# (label, sql, params). The SQL is FlaskApp.py's own: named queries from
+# the registry plus the SQL helpers the endpoints build their queries with.
+TODAY = date.today()
+HOT_QUERIES = [
+    ("guard_today", _named_query("guard_today"), (TODAY,)),
+    ("duplicate_appointment", _named_query("duplicate_appointment"), ("Seed Visitor 1", TODAY, time(9, 0))),
+    ("dep visitors", visitor_list_sql(VISITOR_LIST_FIELDS, ["department = %s"]), ("DEPT1",)),
+    ("admin visitors page (department filter)",
+     visitor_list_sql(VISITOR_LIST_FIELDS, ["department = %s"], "limit %s"), ("DEPT1", VISITORS_PAGE_SIZE + 1)),
+    ("premises_inside", _named_query("premises_inside"), ()),
+    ("premises_inside_department", _named_query("premises_inside_department"), ("DEPT1",)),
+    ("premises_left", _named_query("premises_left"), (TODAY,)),
+    ("premises_left_department", _named_query("premises_left_department"), (TODAY, "DEPT1")),
+    ("notifications_for_role", _named_query("notifications_for_role"), ("guard", NOTIFICATIONS_PAGE_SIZE)),
+    ("notifications_for_department", _named_query("notifications_for_department"),
+     ("dep_head", "DEPT1", NOTIFICATIONS_PAGE_SIZE)),
+    ("notifications_unassigned", _named_query("notifications_unassigned"), ("dep_head", NOTIFICATIONS_PAGE_SIZE)),
+    ("notifications_for_department_since", _named_query("notifications_for_department_since"),
+     ("dep_head", "DEPT1", 0, NOTIFICATIONS_PAGE_SIZE)),
+]
+
+CHECKED_TABLES = {"visitors", "notifications"}
+
+
+def seq_scans(plan):
+    # Relations read by a Seq Scan anywhere in the plan tree
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in CHECKED_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def main(argv):
+    seed_rows = 0
+    if "--seed" in argv:
+        seed_rows = int(argv[argv.index("--seed") + 1])
+
+    failures = []
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            if seed_rows:
+                print(f"seeding {seed_rows} visitors / {seed_rows * 2} notifications ...")
+                for sql in SEED_SQL:
+                    cur.execute(sql, {"rows": seed_rows})
+                cur.execute("analyze public.visitors")
+                cur.execute("analyze public.notifications")
+
+            for label, sql, params in HOT_QUERIES:
+                cur.execute("explain (format json) " + sql, params)
+                plan = cur.fetchone()
+                plan = plan["QUERY PLAN"] if isinstance(plan, dict) else plan[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+
+                scans = seq_scans(plan[0]["Plan"])
+                if scans:
+                    failures.append(label)
+                    print(f"FAIL  {label}: seq scan on {', '.join(scans)}")
+                else:
+                    print(f"ok    {label}")
+    finally:
+        conn.rollback()
+        conn.close()
+
+    if failures:
+        print(f"{len(failures)} of {len(HOT_QUERIES)} queries fall back to a sequential scan")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,116 @@
+import os
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+# Negotiated gzip / brotli compression for responses (after_request hook).
+#
+# Buffered responses are compressed once they reach COMPRESS_MIN_SIZE.
+# Streamed responses (download_csv, stream_json_array) are always
+# compressed chunk by chunk, so they stay streamed.
+
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", "6"))
+# 11 is far too slow for per-request compression; 4-5 is close to gzip -6
+# speed with smaller output
+BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", "5"))
+
+# A streamed response is flushed to the client after this much input
+COMPRESS_FLUSH_BYTES = 32 * 1024
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+}
+
+
+def _compressible(response) -> bool:
+    mimetype = response.mimetype or ""
+    if mimetype == "text/event-stream":
+        return False  # SSE events must reach the client as they are sent
+    return mimetype.startswith("text/") or mimetype in COMPRESSIBLE_TYPES
+
+
+def _negotiate():
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+
+def _compressor(encoding):
+    # -> (compress(data), flush(), finish()) for one response body
+    if encoding == "br":
+        c = brotli.Compressor(quality=BROTLI_QUALITY)
+        return c.process, c.flush, c.finish
+
+    c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+    return c.compress, lambda: c.flush(zlib.Z_SYNC_FLUSH), c.flush
+
+
+def _weaken_etag(response):
+    # The compressed body differs from the identity one byte for byte
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def _stream(chunks, encoding):
+    compress, flush, finish = _compressor(encoding)
+    pending = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            out = compress(chunk)
+            pending += len(chunk)
+            if pending >= COMPRESS_FLUSH_BYTES:
+                out += flush()
+                pending = 0
+            if out:
+                yield out
+        yield finish()
+    finally:
+        # release the wrapped generator (and its DB cursor) right away
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def compress_response(response):
+    if request.method == "HEAD" or response.direct_passthrough:
+        return response
+    if "Content-Encoding" in response.headers:
+        return response
+
+    if response.status_code == 304:
+        if _negotiate():
+            _weaken_etag(response)
+        return response
+
+    if response.status_code < 200 or response.status_code == 204 or not _compressible(response):
+        return response
+
+    response.vary.add("Accept-Encoding")
+
+    encoding = _negotiate()
+    if not encoding:
+        return response
+
+    if response.is_streamed:
+        response.response = _stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        compress, _, finish = _compressor(encoding)
+        response.set_data(compress(data) + finish())
+
+    response.headers["Content-Encoding"] = encoding
+    _weaken_etag(response)
+    return response
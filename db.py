@@ -1,9 +1,78 @@
 import os
+import hashlib
+import itertools
+import json
+import logging
 import socket
+from functools import partial
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
 import psycopg
+from psycopg import sql
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 
+# Pool sizing (per worker process). Override with env vars on Render.
+POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+POOL_MAX_IDLE = float(os.environ.get("DB_POOL_MAX_IDLE", "300"))      # seconds before an idle conn is closed
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))         # seconds to wait for a free conn
+
+# Server-side prepared statements for registered queries. Turn off (0) when
+# connecting through a transaction-mode pooler such as PgBouncer.
+PREPARED_STATEMENTS = os.environ.get("DB_PREPARED_STATEMENTS", "1") == "1"
+
+# Queries slower than this (ms) are written to the "db.slow" log
+SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", "500"))
+
+# Optional read replica. Only reads inside read_only() go there, and only
+# while its replay lag stays under DB_REPLICA_MAX_LAG seconds.
+REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", "10"))
+REPLICA_CHECK_INTERVAL = float(os.environ.get("DB_REPLICA_CHECK_INTERVAL", "5"))
+# A replica that can't hand out a connection this fast (seconds) is treated
+# as down and the read goes to the primary; connect_timeout for its
+# connections (libpq: whole seconds, at least 2)
+REPLICA_TIMEOUT = float(os.environ.get("DB_REPLICA_TIMEOUT", "2"))
+REPLICA_CONNECT_TIMEOUT = int(os.environ.get("DB_REPLICA_CONNECT_TIMEOUT", "2"))
+
+# How long a resolved database address is trusted before re-resolving
+DNS_TTL = float(os.environ.get("DB_DNS_TTL", "300"))
+
+_pools = {}          # "primary" / "replica" -> ConnectionPool
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+_replica_state = {"checked_at": None, "ok": False, "lag": None}
+_replica_lock = threading.Lock()
+
+# True inside read_only(): reads may be served by the replica
+_read_only = ContextVar("db_read_only", default=False)
+
+# Connection of the transaction() block currently running (per thread/task)
+_tx_conn = ContextVar("db_tx_conn", default=None)
+
+# Per-request query log (a list of dicts), see begin_request_log()
+_request_log = ContextVar("db_request_log", default=None)
+# Per-request "did we write" flag (a one-item list), see request_wrote()
+_request_wrote = ContextVar("db_request_wrote", default=None)
+
+_slow_log = logging.getLogger("db.slow")
+
+# Named query registry: name -> sql, plus per-name execution stats
+_queries = {}
+_query_stats = {}
+_query_stats_lock = threading.Lock()
+
+# Unique names for server-side cursors
+_cursor_ids = itertools.count(1)
+
+_dns_cache = {}
+_dns_lock = threading.Lock()
+_dns_stats = {"hits": 0, "misses": 0, "refreshes": 0, "failovers": 0}
+
 def _ensure_sslmode(url: str) -> str:
     # Ensure sslmode=require exists in query string
     parsed = urlparse(url)
@@ -12,47 +81,512 @@ def _ensure_sslmode(url: str) -> str:
     new_query = urlencode(qs)
     return urlunparse(parsed._replace(query=new_query))
 
-def _resolve_ipv4(hostname: str) -> str:
-    # Forces an IPv4 address (A record). This bypasses IPv6.
+def _lookup_ipv4(hostname: str) -> list:
+    # Forces IPv4 addresses (A records). This bypasses IPv6.
     # If your DNS only has IPv6, this will fail (but Supabase has IPv4).
-    return socket.gethostbyname(hostname)
+    return socket.gethostbyname_ex(hostname)[2]
 
-def get_conn():
-    url = os.environ.get("DATABASE_URL")
+def _refresh_dns(hostname: str):
+    try:
+        addrs = _lookup_ipv4(hostname)
+    except OSError as e:
+        # Keep serving the old addresses, try again next time
+        print("DNS refresh failed:", hostname, e)
+        addrs = None
+
+    with _dns_lock:
+        entry = _dns_cache.get(hostname)
+        if addrs:
+            _dns_stats["refreshes"] += 1
+            current = entry["addrs"][entry["index"]] if entry else None
+            _dns_cache[hostname] = {
+                "addrs": addrs,
+                # stay on the address we were using if it is still listed
+                "index": addrs.index(current) if current in addrs else 0,
+                "expires": time.monotonic() + DNS_TTL,
+                "refreshing": False,
+            }
+        elif entry:
+            entry["refreshing"] = False
+
+def _resolve_ipv4(hostname: str) -> str:
+    # Cached lookup. A stale entry is still returned while a background
+    # thread re-resolves it, so only the very first query waits on DNS.
+    with _dns_lock:
+        entry = _dns_cache.get(hostname)
+        if entry:
+            _dns_stats["hits"] += 1
+            if time.monotonic() >= entry["expires"] and not entry["refreshing"]:
+                entry["refreshing"] = True
+                threading.Thread(target=_refresh_dns, args=(hostname,), daemon=True).start()
+            return entry["addrs"][entry["index"]]
+        _dns_stats["misses"] += 1
+
+    addrs = _lookup_ipv4(hostname)
+
+    with _dns_lock:
+        entry = _dns_cache.setdefault(hostname, {
+            "addrs": addrs,
+            "index": 0,
+            "expires": time.monotonic() + DNS_TTL,
+            "refreshing": False,
+        })
+        return entry["addrs"][entry["index"]]
+
+def _mark_ipv4_failed(hostname: str, addr: str):
+    # Connect to addr failed: rotate to the next A record for this host
+    with _dns_lock:
+        entry = _dns_cache.get(hostname)
+        if not entry or entry["addrs"][entry["index"]] != addr:
+            return
+        entry["index"] = (entry["index"] + 1) % len(entry["addrs"])
+        _dns_stats["failovers"] += 1
+
+def dns_stats() -> dict:
+    with _dns_lock:
+        stats = dict(_dns_stats)
+        stats["hosts"] = {h: list(e["addrs"]) for h, e in _dns_cache.items()}
+    return stats
+
+def _database_url(env="DATABASE_URL") -> str:
+    url = os.environ.get(env)
     if not url:
-        raise RuntimeError("DATABASE_URL is not set")
+        raise RuntimeError(f"{env} is not set")
 
     url = _ensure_sslmode(url)
 
-    parsed = urlparse(url)
-    host = parsed.hostname
-    if not host:
-        raise RuntimeError("DATABASE_URL missing hostname")
+    if not urlparse(url).hostname:
+        raise RuntimeError(f"{env} missing hostname")
 
-    ipv4 = _resolve_ipv4(host)
+    return url
+
+def _connect_kwargs(url=None, connect_timeout=None) -> dict:
+    # Called for every new connection (also by the pool), so a changed
+    # IPv4 address is picked up when the pool reconnects.
+    host = urlparse(url or _database_url()).hostname
 
     # KEY PART:
     # hostaddr forces the TCP connection to use that IP, even if DNS prefers IPv6.
-    return psycopg.connect(
-        url,
-        hostaddr=ipv4,
-        row_factory=dict_row
-    )
+    kwargs = {
+        "hostaddr": _resolve_ipv4(host),
+        "row_factory": dict_row,
+        # None disables psycopg's automatic preparing as well
+        "prepare_threshold": 5 if PREPARED_STATEMENTS else None,
+    }
+    if connect_timeout:
+        kwargs["connect_timeout"] = connect_timeout
+    return kwargs
+
+class _FailoverConnection(psycopg.Connection):
+    # Used by the pool: when a connect fails, rotate the cached address so
+    # the pool's next attempt goes to another A record.
+    @classmethod
+    def connect(cls, conninfo="", **kwargs):
+        try:
+            return super().connect(conninfo, **kwargs)
+        except psycopg.OperationalError:
+            hostaddr = kwargs.get("hostaddr")
+            if hostaddr:
+                _mark_ipv4_failed(urlparse(conninfo).hostname, hostaddr)
+            raise
+
+def get_conn():
+    # A dedicated (non-pooled) connection. Prefer fetchone/fetchall/execute.
+    url = _database_url()
+    host = urlparse(url).hostname
+
+    attempts = len(_dns_cache.get(host, {}).get("addrs", ())) or 1
+    for attempt in range(attempts):
+        kwargs = _connect_kwargs(url)
+        try:
+            return psycopg.connect(url, **kwargs)
+        except psycopg.OperationalError:
+            _mark_ipv4_failed(host, kwargs["hostaddr"])
+            if attempt == attempts - 1:
+                raise
+
+def _get_pool(role, env) -> ConnectionPool:
+    # One pool per role per worker process. A pool inherited through fork()
+    # shares sockets and threads with the parent, so the child builds its own.
+    global _pool_pid
+
+    pid = os.getpid()
+    pool = _pools.get(role)
+    if pool is not None and _pool_pid == pid:
+        return pool
+
+    with _pool_lock:
+        if _pool_pid != pid:
+            _pools.clear()
+            _pool_pid = pid
+
+        if role not in _pools:
+            url = _database_url(env)
+            # An unreachable replica must fail fast: reads fall back to primary
+            connect_timeout = REPLICA_CONNECT_TIMEOUT if role == "replica" else None
+            _pools[role] = ConnectionPool(
+                url,
+                kwargs=partial(_connect_kwargs, url, connect_timeout=connect_timeout),
+                connection_class=_FailoverConnection,
+                min_size=POOL_MIN_SIZE,
+                max_size=max(POOL_MAX_SIZE, POOL_MIN_SIZE),
+                max_idle=POOL_MAX_IDLE,
+                timeout=POOL_TIMEOUT,
+                check=ConnectionPool.check_connection,  # health check on checkout
+                name=f"db-{role}-{pid}",
+                open=True,
+            )
+
+        return _pools[role]
+
+def get_pool() -> ConnectionPool:
+    return _get_pool("primary", "DATABASE_URL")
+
+def replica_configured() -> bool:
+    return bool(os.environ.get("READ_DATABASE_URL"))
+
+def get_read_pool():
+    # None when no READ_DATABASE_URL is set
+    if not replica_configured():
+        return None
+    return _get_pool("replica", "READ_DATABASE_URL")
+
+def close_pool():
+    global _pool_pid
+
+    with _pool_lock:
+        if _pool_pid == os.getpid():
+            for pool in _pools.values():
+                pool.close()
+        _pools.clear()
+        _pool_pid = None
+
+def _reset_after_fork():
+    # Runs in the child right after fork(): forget the parent's pools
+    # (don't close them, the parent still owns those sockets).
+    global _pool_pid, _pool_lock, _dns_lock, _replica_lock
+    _pools.clear()
+    _pool_pid = None
+    _pool_lock = threading.Lock()
+    _dns_lock = threading.Lock()
+    _replica_lock = threading.Lock()
+    _replica_state.update(checked_at=None, ok=False, lag=None)
+    for entry in _dns_cache.values():
+        entry["refreshing"] = False
+
+def _check_replica():
+    # Seconds the replica is behind; 0 when it has replayed everything it got
+    with get_read_pool().connection(timeout=REPLICA_TIMEOUT) as conn:
+        row = conn.execute("""
+            select case
+                when pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() then 0
+                else coalesce(extract(epoch from now() - pg_last_xact_replay_timestamp()), 0)
+            end as lag
+        """).fetchone()
+    return float(row["lag"])
 
-def fetchone(query, params=()):
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(query, params)
-            return cur.fetchone()
+def replica_healthy() -> bool:
+    # Cached for REPLICA_CHECK_INTERVAL; one thread re-checks, the rest use
+    # the last answer. Any error counts as unhealthy (reads go to primary).
+    if not replica_configured():
+        return False
 
-def fetchall(query, params=()):
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(query, params)
-            return cur.fetchall()
+    now = time.monotonic()
+    checked_at = _replica_state["checked_at"]
+    if checked_at is not None and now - checked_at < REPLICA_CHECK_INTERVAL:
+        return _replica_state["ok"]
+
+    if not _replica_lock.acquire(blocking=False):
+        return _replica_state["ok"]
+    try:
+        try:
+            lag = _check_replica()
+            ok = lag <= REPLICA_MAX_LAG
+        except (psycopg.Error, OSError) as e:
+            print("replica check failed:", e)
+            lag, ok = None, False
+        _replica_state.update(checked_at=time.monotonic(), ok=ok, lag=lag)
+        return ok
+    finally:
+        _replica_lock.release()
+
+def _replica_failed(error):
+    # A read couldn't get a replica connection: send reads to the primary
+    # until the next check (REPLICA_CHECK_INTERVAL) finds it healthy again
+    print("replica unavailable, using primary:", error)
+    _replica_state.update(checked_at=time.monotonic(), ok=False, lag=None)
+
+def replica_status() -> dict:
+    return {
+        "configured": replica_configured(),
+        "ok": _replica_state["ok"],
+        "lag": _replica_state["lag"],
+    }
+
+@contextmanager
+def read_only():
+    # Reads inside this block may go to the replica (when configured and not
+    # lagging). Don't write in here: the replica rejects writes.
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+@contextmanager
+def transaction():
+    # Unit of work: everything inside runs on one connection and is committed
+    # once at the end (rolled back if the block raises).
+    #
+    #     with db.transaction() as tx:
+    #         execute(...)      # joins tx automatically
+    #         fetchone(...)
+    #
+    # Nested transaction() blocks become savepoints.
+    _mark_write()
+
+    conn = _tx_conn.get()
+    if conn is not None:
+        with conn.transaction():
+            yield conn
+        return
+
+    with get_pool().connection() as conn:
+        token = _tx_conn.set(conn)
+        try:
+            with conn.transaction():
+                yield conn
+        finally:
+            _tx_conn.reset(token)
+
+def in_transaction() -> bool:
+    return _tx_conn.get() is not None
+
+@contextmanager
+def _connection():
+    # Inside transaction(): reuse its connection, the block commits.
+    # Outside: borrow a pooled connection, committed when returned.
+    conn = _tx_conn.get()
+    if conn is not None:
+        yield conn
+        return
+
+    if use_replica():
+        # Only a failure to get the connection falls back to the primary;
+        # errors raised while it is in use propagate as usual
+        acquired = False
+        try:
+            with get_read_pool().connection(timeout=REPLICA_TIMEOUT) as conn:
+                acquired = True
+                yield conn
+            return
+        except psycopg.OperationalError as e:  # includes PoolTimeout
+            if acquired:
+                raise
+            _replica_failed(e)
+
+    with get_pool().connection() as conn:
+        yield conn
+
+def use_replica() -> bool:
+    # Replica only for read_only() blocks outside a transaction
+    return _read_only.get() and _tx_conn.get() is None and replica_healthy()
+
+def _mark_write():
+    wrote = _request_wrote.get()
+    if wrote is not None:
+        wrote[0] = True
+
+def _fingerprint(query) -> str:
+    # Same SQL text (ignoring whitespace) -> same fingerprint; values are
+    # always passed as params so they never end up in here.
+    return hashlib.md5(" ".join(query.split()).encode()).hexdigest()[:12]
+
+def _record_query(query, name, started, acquired, finished, rows):
+    entry = {
+        "fingerprint": _fingerprint(query),
+        "name": name,
+        "duration_ms": round((finished - acquired) * 1000, 3),
+        "acquire_ms": round((acquired - started) * 1000, 3),
+        "rows": rows,
+    }
+
+    log = _request_log.get()
+    if log is not None:
+        log.append(entry)
+
+    if entry["duration_ms"] >= SLOW_QUERY_MS:
+        _slow_log.warning(json.dumps(dict(entry, sql=" ".join(query.split())[:500])))
+
+def _run(query, params, fetch, prepare=None, name=None, row_factory=None):
+    started = time.perf_counter()
+    acquired = started
+    rows = -1
+    try:
+        with _connection() as conn:
+            acquired = time.perf_counter()
+            with conn.cursor(row_factory=row_factory) as cur:
+                cur.execute(query, params, prepare=prepare)
+                if fetch == "one":
+                    result = cur.fetchone()
+                    rows = 1 if result is not None else 0
+                elif fetch == "all":
+                    result = cur.fetchall()
+                    rows = len(result)
+                else:
+                    result = None
+                    rows = cur.rowcount
+        return result
+    finally:
+        _record_query(query, name, started, acquired, time.perf_counter(), rows)
+
+# row_factory: psycopg row factory for this query (default dict_row),
+# e.g. serializers.json_row
+
+def fetchone(query, params=(), row_factory=None):
+    return _run(query, params, "one", row_factory=row_factory)
+
+def fetchall(query, params=(), row_factory=None):
+    return _run(query, params, "all", row_factory=row_factory)
 
 def execute(query, params=()):
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(query, params)
-            conn.commit()
\ No newline at end of file
+    _mark_write()
+    _run(query, params, None)
+
+def iter_rows(query, params=(), batch_size=500, row_factory=None):
+    # Streams rows through a named (server-side) cursor: only batch_size rows
+    # are held in memory at a time, however big the result is. The connection
+    # stays checked out until the generator is exhausted or closed.
+    started = time.perf_counter()
+    acquired = started
+    rows = 0
+    try:
+        with _connection() as conn:
+            acquired = time.perf_counter()
+            with conn.cursor(name=f"db_iter_{next(_cursor_ids)}", row_factory=row_factory) as cur:
+                cur.itersize = batch_size
+                cur.execute(query, params)
+                for row in cur:
+                    rows += 1
+                    yield row
+    finally:
+        _record_query(query, None, started, acquired, time.perf_counter(), rows)
+
+def executemany(query, params_seq, batch_size=1000):
+    # Runs query once per params tuple. params_seq can be any iterable
+    # (e.g. a generator over a CSV); it is consumed batch_size rows at a
+    # time and psycopg pipelines each batch. Returns the number of rows.
+    _mark_write()
+
+    started = time.perf_counter()
+    acquired = started
+    total = 0
+    try:
+        with _connection() as conn:
+            acquired = time.perf_counter()
+            with conn.cursor() as cur:
+                params_iter = iter(params_seq)
+                while True:
+                    batch = list(itertools.islice(params_iter, batch_size))
+                    if not batch:
+                        break
+                    cur.executemany(query, batch)
+                    total += len(batch)
+        return total
+    finally:
+        _record_query(query, None, started, acquired, time.perf_counter(), total)
+
+def copy_rows(table, columns, rows, schema="public"):
+    # Bulk load with COPY ... FROM STDIN. rows is any iterable of tuples in
+    # `columns` order and is streamed to the server row by row, so large
+    # imports never sit in memory. Returns the number of rows.
+    _mark_write()
+
+    statement = sql.SQL("copy {} ({}) from stdin").format(
+        sql.Identifier(schema, table),
+        sql.SQL(", ").join(sql.Identifier(c) for c in columns),
+    )
+    label = f"copy {schema}.{table} ({', '.join(columns)}) from stdin"
+
+    started = time.perf_counter()
+    acquired = started
+    total = 0
+    try:
+        with _connection() as conn:
+            acquired = time.perf_counter()
+            with conn.cursor() as cur:
+                with cur.copy(statement) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+                        total += 1
+        return total
+    finally:
+        _record_query(label, None, started, acquired, time.perf_counter(), total)
+
+def begin_request_log():
+    # Start collecting query stats for the current request (thread/task)
+    _request_log.set([])
+    _request_wrote.set([False])
+
+def request_log() -> list:
+    return _request_log.get() or []
+
+def request_wrote() -> bool:
+    # True if this request ran execute() or a transaction()
+    wrote = _request_wrote.get()
+    return bool(wrote and wrote[0])
+
+def register_query(name, query):
+    # Registered queries are prepared once per pooled connection (psycopg
+    # keeps the prepared statement on the connection) and run by name.
+    if name in _queries and _queries[name] != query:
+        raise ValueError(f"Query {name!r} is already registered with different SQL")
+    _queries[name] = query
+
+def _named_query(name):
+    try:
+        return _queries[name]
+    except KeyError:
+        raise KeyError(f"Unknown query {name!r}, call register_query() first") from None
+
+def _run_named(name, params, fetch, row_factory=None):
+    query = _named_query(name)
+
+    start = time.perf_counter()
+    result = _run(query, params, fetch, prepare=True if PREPARED_STATEMENTS else False, name=name,
+                  row_factory=row_factory)
+    _record_query_stats(name, (time.perf_counter() - start) * 1000)
+
+    return result
+
+def _record_query_stats(name, elapsed_ms):
+    with _query_stats_lock:
+        stats = _query_stats.setdefault(name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["calls"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+def fetchone_named(name, params=(), row_factory=None):
+    return _run_named(name, params, "one", row_factory)
+
+def fetchall_named(name, params=(), row_factory=None):
+    return _run_named(name, params, "all", row_factory)
+
+def execute_named(name, params=()):
+    _mark_write()
+    _run_named(name, params, None)
+
+def query_stats() -> dict:
+    with _query_stats_lock:
+        return {
+            name: {
+                "calls": st["calls"],
+                "total_ms": round(st["total_ms"], 3),
+                "avg_ms": round(st["total_ms"] / st["calls"], 3) if st["calls"] else 0.0,
+                "max_ms": round(st["max_ms"], 3),
+            }
+            for name, st in _query_stats.items()
+        }
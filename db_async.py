@@ -0,0 +1,216 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import partial
+import threading
+import time
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+from urllib.parse import urlparse
+
+import db
+
+# Async twin of db.py. All coroutines run on one background event loop per
+# worker process, so sync Flask views can fire several queries at once:
+#
+#     inside, left = db_async.gather(
+#         db_async.fetchall("select ...", params),
+#         db_async.fetchall("select ...", params),
+#     )
+#
+# These connections never join a db.transaction() block; use them for
+# independent reads. Inside db.read_only() they go to the replica like the
+# sync helpers do.
+
+# Only gather() fan-outs (2-3 queries) use this pool, so it stays small; by
+# default 4, never more than the sync pool.
+#
+# Connections per worker process, primary:
+#     DB_POOL_MAX_SIZE (10) + DB_ASYNC_POOL_MAX_SIZE (4) + 1 (db_listen) = 15
+# and with READ_DATABASE_URL another 10 + 4 on the replica. Multiply by
+# workers x instances and keep that under the database's connection limit.
+ASYNC_POOL_MAX_SIZE = int(os.environ.get("DB_ASYNC_POOL_MAX_SIZE", str(min(4, db.POOL_MAX_SIZE))))
+
+_loop = None
+_loop_pid = None
+_pools = {}          # "primary" / "replica" -> AsyncConnectionPool
+_lock = threading.Lock()
+
+# Decided in the calling thread by run(), see db.use_replica()
+_use_replica = ContextVar("db_async_use_replica", default=False)
+
+
+class _FailoverAsyncConnection(psycopg.AsyncConnection):
+    # Same address rotation as db._FailoverConnection
+    @classmethod
+    async def connect(cls, conninfo="", **kwargs):
+        try:
+            return await super().connect(conninfo, **kwargs)
+        except psycopg.OperationalError:
+            hostaddr = kwargs.get("hostaddr")
+            if hostaddr:
+                db._mark_ipv4_failed(urlparse(conninfo).hostname, hostaddr)
+            raise
+
+
+def _get_loop():
+    # Start (once per process) the thread that owns the event loop and pool
+    global _loop, _loop_pid
+
+    pid = os.getpid()
+    if _loop is not None and _loop_pid == pid:
+        return _loop
+
+    with _lock:
+        if _loop is None or _loop_pid != pid:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="db-async-loop", daemon=True).start()
+            _loop = loop
+            _loop_pid = pid
+            _pools.clear()
+
+    return _loop
+
+
+async def _get_pool(role="primary") -> AsyncConnectionPool:
+    # Only ever called on the background loop, so no lock is needed
+    if role not in _pools:
+        url = db._database_url("READ_DATABASE_URL" if role == "replica" else "DATABASE_URL")
+        # Same fail-fast replica connects as db._get_pool
+        connect_timeout = db.REPLICA_CONNECT_TIMEOUT if role == "replica" else None
+        pool = AsyncConnectionPool(
+            url,
+            kwargs=partial(db._connect_kwargs, url, connect_timeout=connect_timeout),
+            connection_class=_FailoverAsyncConnection,
+            min_size=db.POOL_MIN_SIZE,
+            max_size=max(ASYNC_POOL_MAX_SIZE, db.POOL_MIN_SIZE),
+            max_idle=db.POOL_MAX_IDLE,
+            timeout=db.POOL_TIMEOUT,
+            check=AsyncConnectionPool.check_connection,
+            name=f"db-async-{role}-{os.getpid()}",
+            open=False,
+        )
+        await pool.open()
+        _pools[role] = pool
+
+    return _pools[role]
+
+
+def _reset_after_fork():
+    global _loop, _loop_pid, _lock
+    _loop = None
+    _loop_pid = None
+    _pools.clear()
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@asynccontextmanager
+async def _connection():
+    # Same rules as db._connection(): a replica that can't hand out a
+    # connection within db.REPLICA_TIMEOUT is marked down and the query
+    # runs on the primary; errors once connected propagate as usual
+    if _use_replica.get() and db._replica_state["ok"]:
+        acquired = False
+        try:
+            pool = await _get_pool("replica")
+            async with pool.connection(timeout=db.REPLICA_TIMEOUT) as conn:
+                acquired = True
+                yield conn
+            return
+        except psycopg.OperationalError as e:  # includes PoolTimeout
+            if acquired:
+                raise
+            db._replica_failed(e)
+
+    pool = await _get_pool("primary")
+    async with pool.connection() as conn:
+        yield conn
+
+
+async def _run(query, params, fetch, prepare=None, name=None, row_factory=None):
+    started = time.perf_counter()
+    acquired = started
+    rows = -1
+    try:
+        async with _connection() as conn:
+            acquired = time.perf_counter()
+            async with conn.cursor(row_factory=row_factory) as cur:
+                await cur.execute(query, params, prepare=prepare)
+                if fetch == "one":
+                    result = await cur.fetchone()
+                    rows = 1 if result is not None else 0
+                elif fetch == "all":
+                    result = await cur.fetchall()
+                    rows = len(result)
+                else:
+                    result = None
+                    rows = cur.rowcount
+        return result
+    finally:
+        db._record_query(query, name, started, acquired, time.perf_counter(), rows)
+
+
+async def fetchone(query, params=(), row_factory=None):
+    return await _run(query, params, "one", row_factory=row_factory)
+
+
+async def fetchall(query, params=(), row_factory=None):
+    return await _run(query, params, "all", row_factory=row_factory)
+
+
+async def execute(query, params=()):
+    await _run(query, params, None)
+
+
+async def _run_named(name, params, fetch, row_factory=None):
+    query = db._named_query(name)
+
+    start = time.perf_counter()
+    result = await _run(query, params, fetch, prepare=True if db.PREPARED_STATEMENTS else False, name=name,
+                        row_factory=row_factory)
+    db._record_query_stats(name, (time.perf_counter() - start) * 1000)
+
+    return result
+
+
+async def fetchone_named(name, params=(), row_factory=None):
+    return await _run_named(name, params, "one", row_factory)
+
+
+async def fetchall_named(name, params=(), row_factory=None):
+    return await _run_named(name, params, "all", row_factory)
+
+
+def run(coro, timeout=None):
+    # Run a coroutine on the worker's db loop and block until it finishes.
+    # The caller's request log and replica routing are carried over so the
+    # queries behave as if the request had run them itself.
+    log = db._request_log.get()
+    replica = db.use_replica()
+
+    async def _in_caller_context():
+        db._request_log.set(log)
+        _use_replica.set(replica)
+        return await coro
+
+    future = asyncio.run_coroutine_threadsafe(_in_caller_context(), _get_loop())
+    return future.result(timeout)
+
+
+def gather(*coros, timeout=None):
+    # Run independent queries concurrently, results in argument order
+    async def _gather():
+        return await asyncio.gather(*coros)
+
+    return run(_gather(), timeout)
+
+
+async def close_pool():
+    for pool in list(_pools.values()):
+        await pool.close()
+    _pools.clear()
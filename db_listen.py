@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from psycopg import sql
+
+import db
+
+# Postgres LISTEN/NOTIFY for this worker process. One background thread
+# holds a dedicated connection, LISTENs on every channel a handler was
+# registered for and calls the handlers with each payload:
+#
+#     db_listen.listen("notifications_guard", on_guard_notification)
+#
+# NOTIFY is delivered on commit to every listening connection, so all
+# workers and instances on the same database see the same events without
+# a separate broker. Handlers run on the listener thread: keep them short.
+
+# How often the listener wakes up to pick up newly registered channels
+POLL_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30
+# listen() waits at most this long for the LISTEN to take effect
+LISTEN_WAIT_SECONDS = 5
+
+_handlers = {}          # channel -> {callback(payload): listen() count}
+_reconnect_handlers = []
+_active = set()         # channels the current connection is LISTENing on
+_lock = threading.Lock()
+_changed = threading.Condition(_lock)
+_thread_pid = None
+
+
+def listen(channel, callback) -> bool:
+    # Registers callback for channel, makes sure this process's listener
+    # thread is running and waits until the channel is listened on, so
+    # nothing committed after this returns is missed. False if the listener
+    # isn't connected (yet). Pair every call with unlisten().
+    with _lock:
+        callbacks = _handlers.setdefault(channel, {})
+        callbacks[callback] = callbacks.get(callback, 0) + 1
+    _start()
+
+    with _changed:
+        return _changed.wait_for(lambda: channel in _active, timeout=LISTEN_WAIT_SECONDS)
+
+
+def unlisten(channel, callback):
+    # Undoes one listen(): once a channel has no callbacks left the listener
+    # thread UNLISTENs it
+    with _lock:
+        callbacks = _handlers.get(channel)
+        if not callbacks or callback not in callbacks:
+            return
+        callbacks[callback] -= 1
+        if callbacks[callback] <= 0:
+            del callbacks[callback]
+        if not callbacks:
+            del _handlers[channel]
+
+
+def on_reconnect(callback):
+    # Called after the listener lost its connection: notifications sent
+    # while it was down are gone, consumers should resync
+    with _lock:
+        if callback not in _reconnect_handlers:
+            _reconnect_handlers.append(callback)
+
+
+def _start():
+    global _thread_pid
+
+    pid = os.getpid()
+    if _thread_pid == pid:
+        return
+
+    with _lock:
+        if _thread_pid != pid:
+            _thread_pid = pid
+            threading.Thread(target=_run, name="db-listen", daemon=True).start()
+
+
+def _reset_after_fork():
+    # Runs in the child right after fork(): the listener thread and its
+    # connection stay with the parent, and so do the streams that registered
+    # the handlers. on_reconnect() callbacks are module-level and kept.
+    global _lock, _changed, _thread_pid
+    _lock = threading.Lock()
+    _changed = threading.Condition(_lock)
+    _thread_pid = None
+    _active.clear()
+    _handlers.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _dispatch(channel, payload):
+    with _lock:
+        callbacks = list(_handlers.get(channel, ()))
+    for callback in callbacks:
+        try:
+            callback(payload)
+        except Exception as e:
+            print("LISTEN handler failed:", channel, e)
+
+
+def _run():
+    backoff = 1
+    lost = False
+    while True:
+        conn = None
+        try:
+            conn = db.get_conn()
+            conn.autocommit = True
+            listening = set()
+
+            if lost:
+                with _lock:
+                    callbacks = list(_reconnect_handlers)
+                for callback in callbacks:
+                    try:
+                        callback()
+                    except Exception as e:
+                        print("LISTEN reconnect handler failed:", e)
+            backoff = 1
+
+            while True:
+                with _lock:
+                    channels = set(_handlers)
+                    # listen() for a dropped channel must wait for the
+                    # LISTEN below again, not see it as still active
+                    dropped = listening - channels
+                    _active.difference_update(dropped)
+                for channel in dropped:
+                    conn.execute(sql.SQL("unlisten {}").format(sql.Identifier(channel)))
+                    listening.discard(channel)
+                for channel in channels - listening:
+                    conn.execute(sql.SQL("listen {}").format(sql.Identifier(channel)))
+                    listening.add(channel)
+                    with _changed:
+                        _active.add(channel)
+                        _changed.notify_all()
+
+                for notify in conn.notifies(timeout=POLL_SECONDS):
+                    _dispatch(notify.channel, notify.payload)
+        except Exception as e:
+            print("LISTEN connection lost:", e)
+            lost = True
+            with _lock:
+                _active.clear()
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+        time.sleep(backoff)
+        backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
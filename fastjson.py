@@ -0,0 +1,93 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: without it the stdlib json module is used
+    orjson = None
+
+# JSON encoding for API responses.
+#
+# FastJSONProvider makes jsonify() use orjson when it is installed (same
+# output as Flask's encoder: dates still go through Flask's default).
+# stream_json_array() sends a large list element by element while the rows
+# are read from the cursor, instead of building the whole list first.
+
+# Stream chunks are flushed once they reach this size
+STREAM_CHUNK_BYTES = 16 * 1024
+
+_END = object()
+_MARKER = "\0stream_json_array\0"
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.get("indent"):
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def dumps_bytes(self, obj) -> bytes:
+        if orjson is None:
+            return super().dumps(obj, separators=(",", ":")).encode()
+
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def response(self, *args, **kwargs):
+        # Debug / compact=False keeps Flask's indented output
+        if orjson is None or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+
+def stream_json_array(app, rows, key=None, **fields):
+    # Streams `rows` (any iterable of JSON-ready items, e.g. db.iter_rows())
+    # as a JSON array: bare when key is None, otherwise as
+    # {**fields, key: [...]}.
+    #
+    # The first row is read before the response is returned, so the query
+    # runs inside the view (read_only(), error handling and status codes
+    # work as usual) and the stream only carries rows that already exist.
+    provider = app.json
+    rows = iter(rows)
+    first = next(rows, _END)
+
+    if key is None:
+        head, tail = b"[", b"]\n"
+    else:
+        # encode the wrapper with a placeholder where the array goes
+        marker = provider.dumps_bytes(_MARKER)
+        head, tail = provider.dumps_bytes({**fields, key: _MARKER}).split(marker)
+        head, tail = head + b"[", b"]" + tail + b"\n"
+
+    def generate():
+        try:
+            chunk = [head]
+            size = len(head)
+            if first is not _END:
+                item = provider.dumps_bytes(first)
+                chunk.append(item)
+                size += len(item)
+
+                for row in rows:
+                    item = provider.dumps_bytes(row)
+                    chunk.append(b",")
+                    chunk.append(item)
+                    size += len(item) + 1
+                    if size >= STREAM_CHUNK_BYTES:
+                        yield b"".join(chunk)
+                        chunk = []
+                        size = 0
+
+            chunk.append(tail)
+            yield b"".join(chunk)
+        finally:
+            # client went away: give the cursor's connection back now
+            close = getattr(rows, "close", None)
+            if close is not None:
+                close()
+
+    return app.response_class(generate(), mimetype=provider.mimetype)
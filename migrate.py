@@ -0,0 +1,150 @@
+import os
+import re
+import sys
+from psycopg import sql
+
+from db import get_conn
+
+# Applies migrations/NNNN_*.sql in order, once each, and records them in
+# public.schema_migrations. Every statement runs in autocommit so that
+# CREATE INDEX CONCURRENTLY works. Write migrations so they can be re-run
+# (if not exists / or replace): a file that fails halfway is retried
+# from the top. A failed CREATE INDEX CONCURRENTLY leaves an INVALID index
+# that "if not exists" would then keep, so such leftovers are dropped
+# before the index is built again.
+#
+#     python migrate.py           apply pending migrations
+#     python migrate.py --list    show applied / pending
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# create [unique] index concurrently [if not exists] <name> on [only] [<schema>.]<table>
+CONCURRENT_INDEX_RE = re.compile(
+    r"create\s+(?:unique\s+)?index\s+concurrently\s+(?:if\s+not\s+exists\s+)?"
+    r"(\w+)\s+on\s+(?:only\s+)?(?:(\w+)\.)?\w+",
+    re.IGNORECASE,
+)
+
+
+def split_statements(text):
+    # Split on ; outside quotes, comments and $$ bodies (trigger functions)
+    statements = []
+    buf = []
+    i = 0
+    quote = None      # "'", '"' or a dollar tag like "$$"
+    while i < len(text):
+        ch = text[i]
+
+        if quote:
+            if text.startswith(quote, i):
+                buf.append(quote)
+                i += len(quote)
+                quote = None
+            else:
+                buf.append(ch)
+                i += 1
+            continue
+
+        if text.startswith("--", i):
+            end = text.find("\n", i)
+            i = len(text) if end == -1 else end + 1
+            continue
+
+        if ch in ("'", '"'):
+            quote = ch
+        elif ch == "$":
+            end = text.find("$", i + 1)
+            tag = text[i:end + 1] if end != -1 else ""
+            if tag and (tag == "$$" or tag[1:-1].isidentifier()):
+                quote = tag
+                buf.append(tag)
+                i += len(tag)
+                continue
+        elif ch == ";":
+            statement = "".join(buf).strip()
+            if statement:
+                statements.append(statement)
+            buf = []
+            i += 1
+            continue
+
+        buf.append(ch)
+        i += 1
+
+    statement = "".join(buf).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def drop_invalid_index(conn, statement):
+    # Before a concurrent index build: drop an index of the same name that
+    # an earlier, failed build left INVALID (the index lives in the table's
+    # schema)
+    match = CONCURRENT_INDEX_RE.match(statement)
+    if not match:
+        return
+
+    name = match.group(1).lower()
+    schema = (match.group(2) or "public").lower()
+    invalid = conn.execute("""
+        select 1
+        from pg_index i
+        join pg_class c on c.oid = i.indexrelid
+        join pg_namespace n on n.oid = c.relnamespace
+        where n.nspname = %s
+          and c.relname = %s
+          and not i.indisvalid
+    """, (schema, name)).fetchone()
+
+    if invalid:
+        print(f"dropping invalid index {schema}.{name}")
+        conn.execute(sql.SQL("drop index concurrently if exists {}.{}").format(
+            sql.Identifier(schema), sql.Identifier(name)
+        ))
+
+
+def migration_files():
+    return sorted(
+        name for name in os.listdir(MIGRATIONS_DIR)
+        if name.endswith(".sql") and name[:4].isdigit()
+    )
+
+
+def applied_versions(conn):
+    conn.execute("""
+        create table if not exists public.schema_migrations (
+            version text primary key,
+            applied_at timestamptz not null default now()
+        )
+    """)
+    return {r["version"] for r in conn.execute("select version from public.schema_migrations")}
+
+
+def migrate(list_only=False):
+    with get_conn() as conn:
+        conn.autocommit = True
+        done = applied_versions(conn)
+
+        for name in migration_files():
+            version = name[:-len(".sql")]
+            if version in done:
+                if list_only:
+                    print("applied ", version)
+                continue
+
+            if list_only:
+                print("pending ", version)
+                continue
+
+            print("applying", version)
+            with open(os.path.join(MIGRATIONS_DIR, name), encoding="utf-8") as f:
+                for statement in split_statements(f.read()):
+                    drop_invalid_index(conn, statement)
+                    conn.execute(statement)
+
+            conn.execute("insert into public.schema_migrations (version) values (%s)", (version,))
+
+
+if __name__ == "__main__":
+    migrate(list_only="--list" in sys.argv[1:])
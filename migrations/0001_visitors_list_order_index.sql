@@ -0,0 +1,5 @@
+-- Keyset pagination for /api/admin/visitors:
+-- order by visit_date desc, visit_time desc, id desc
+-- where (visit_date, visit_time, id) < (...)
+create index concurrently if not exists visitors_list_order_idx
+    on public.visitors (visit_date desc, visit_time desc, id desc);
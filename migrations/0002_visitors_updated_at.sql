@@ -0,0 +1,26 @@
+-- Delta sync (?since=) for /api/admin/visitors and /api/dep/visitors:
+-- every insert/update stamps updated_at, clients ask for rows changed
+-- after their last (updated_at, id).
+alter table public.visitors add column if not exists updated_at timestamptz;
+
+update public.visitors
+set updated_at = coalesce(decided_at, created_at, now())
+where updated_at is null;
+
+alter table public.visitors alter column updated_at set default clock_timestamp();
+alter table public.visitors alter column updated_at set not null;
+
+create or replace function public.set_updated_at() returns trigger as $$
+begin
+    new.updated_at := clock_timestamp();
+    return new;
+end;
+$$ language plpgsql;
+
+drop trigger if exists visitors_set_updated_at on public.visitors;
+create trigger visitors_set_updated_at
+    before insert or update on public.visitors
+    for each row execute function public.set_updated_at();
+
+create index concurrently if not exists visitors_updated_at_idx
+    on public.visitors (updated_at, id);
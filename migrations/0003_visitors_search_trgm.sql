@@ -0,0 +1,10 @@
+-- ?q= search on /api/admin/visitors: substring match (ilike '%q%') over
+-- name, person_to_visit and reason. The expression must stay identical to
+-- VISITOR_SEARCH_SQL in FlaskApp.py or the planner won't use the index.
+create extension if not exists pg_trgm;
+
+create index concurrently if not exists visitors_search_trgm_idx
+    on public.visitors using gin (
+        (coalesce(name, '') || ' ' || coalesce(person_to_visit, '') || ' ' || coalesce(reason, ''))
+        gin_trgm_ops
+    );
@@ -0,0 +1,35 @@
+-- Indexes for the hot visitor / notification queries. Each one names the
+-- query it serves; check_query_plans.py verifies the planner uses them.
+
+-- approved_count_for_date (daily cap), guard_today
+-- (visit_date = ? and status = ? order by visit_time)
+create index concurrently if not exists visitors_date_status_time_idx
+    on public.visitors (visit_date, status, visit_time);
+
+-- duplicate_appointment (name, visit_date, visit_time)
+create index concurrently if not exists visitors_name_date_time_idx
+    on public.visitors (name, visit_date, visit_time);
+
+-- /api/dep/visitors and the department filter on /api/admin/visitors,
+-- same order as visitors_list_order_idx
+create index concurrently if not exists visitors_department_order_idx
+    on public.visitors (department, visit_date desc, visit_time desc, id desc);
+
+-- premises status "inside": only visitors currently on the premises
+create index concurrently if not exists visitors_inside_idx
+    on public.visitors (time_in desc)
+    where time_in is not null and time_out is null;
+
+-- premises status "left today"
+create index concurrently if not exists visitors_left_idx
+    on public.visitors (visit_date, time_out desc)
+    where time_out is not null;
+
+-- notifications_for_role (target_role = ? order by id desc limit 100)
+create index concurrently if not exists notifications_role_id_idx
+    on public.notifications (target_role, id desc);
+
+-- notifications_for_department / notifications_unassigned
+-- (target_role = ? and target_department = ? / is null, order by id desc)
+create index concurrently if not exists notifications_role_department_id_idx
+    on public.notifications (target_role, target_department, id desc);
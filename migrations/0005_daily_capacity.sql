@@ -0,0 +1,19 @@
+-- Approved visitors per visit date, kept in step with visitors.status by
+-- the approve / decline paths in FlaskApp.py (same transaction). The daily
+-- cap is enforced with a conditional upsert on this row (reserve_capacity)
+-- instead of count(*) over visitors.
+create table if not exists public.daily_capacity (
+    visit_date date primary key,
+    approved integer not null default 0 check (approved >= 0),
+    updated_at timestamptz not null default now()
+);
+
+-- Backfill / resync from the current visitor statuses
+insert into public.daily_capacity (visit_date, approved)
+select visit_date, count(*)
+from public.visitors
+where status = 'Approved'
+group by visit_date
+on conflict (visit_date) do update
+    set approved = excluded.approved,
+        updated_at = now();
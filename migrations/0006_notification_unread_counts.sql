@@ -0,0 +1,83 @@
+-- Unread notifications per (target_role, target_department), kept exact by
+-- statement-level triggers on public.notifications, so badge polls
+-- (/api/notifications/unread-count) read a few counter rows instead of
+-- counting. Unassigned rows (target_department is null) are stored under ''.
+create table if not exists public.notification_unread (
+    target_role text not null,
+    target_department text not null default '',
+    unread bigint not null default 0,
+    primary key (target_role, target_department)
+);
+
+-- One function for all three triggers: rows leaving (old_rows) subtract,
+-- rows arriving (new_rows) add; an update does both.
+create or replace function public.notification_unread_apply() returns trigger as $$
+begin
+    if TG_OP in ('UPDATE', 'DELETE') then
+        insert into public.notification_unread as u (target_role, target_department, unread)
+        select target_role, coalesce(target_department, ''), -count(*)
+        from old_rows
+        where is_read is not true
+        group by 1, 2
+        order by 1, 2
+        on conflict (target_role, target_department) do update
+            set unread = u.unread + excluded.unread;
+    end if;
+
+    if TG_OP in ('INSERT', 'UPDATE') then
+        insert into public.notification_unread as u (target_role, target_department, unread)
+        select target_role, coalesce(target_department, ''), count(*)
+        from new_rows
+        where is_read is not true
+        group by 1, 2
+        order by 1, 2
+        on conflict (target_role, target_department) do update
+            set unread = u.unread + excluded.unread;
+    end if;
+
+    return null;
+end;
+$$ language plpgsql;
+
+-- (transition tables need one trigger per event)
+drop trigger if exists notification_unread_insert on public.notifications;
+create trigger notification_unread_insert
+    after insert on public.notifications
+    referencing new table as new_rows
+    for each statement execute function public.notification_unread_apply();
+
+drop trigger if exists notification_unread_update on public.notifications;
+create trigger notification_unread_update
+    after update on public.notifications
+    referencing old table as old_rows new table as new_rows
+    for each statement execute function public.notification_unread_apply();
+
+drop trigger if exists notification_unread_delete on public.notifications;
+create trigger notification_unread_delete
+    after delete on public.notifications
+    referencing old table as old_rows
+    for each statement execute function public.notification_unread_apply();
+
+-- Backfill / resync. The lock keeps notification writes out until the
+-- counters are rebuilt (it is released when this statement commits).
+do $$
+begin
+    lock table public.notifications in share row exclusive mode;
+
+    insert into public.notification_unread as u (target_role, target_department, unread)
+    select s.target_role, s.target_department, coalesce(c.unread, 0)
+    from (
+        select target_role, target_department from public.notification_unread
+        union
+        select target_role, coalesce(target_department, '') from public.notifications
+    ) s
+    left join (
+        select target_role, coalesce(target_department, '') as target_department, count(*) as unread
+        from public.notifications
+        where is_read is not true
+        group by 1, 2
+    ) c using (target_role, target_department)
+    on conflict (target_role, target_department) do update
+        set unread = excluded.unread;
+end;
+$$;
@@ -0,0 +1,20 @@
+-- Retention for public.notifications: archive_notifications.py moves read
+-- rows older than NOTIFICATION_RETENTION_DAYS here, so the live table (and
+-- its indexes) stays the size of the recent traffic.
+create table if not exists public.notifications_archive (
+    like public.notifications including defaults including constraints,
+    archived_at timestamptz not null default now()
+);
+
+create index concurrently if not exists notifications_archive_scope_idx
+    on public.notifications_archive (target_role, target_department, id desc);
+
+-- archive_notifications.py: read rows by age
+create index concurrently if not exists notifications_read_created_idx
+    on public.notifications (created_at)
+    where is_read;
+
+-- mark-all-read only touches unread rows
+create index concurrently if not exists notifications_unread_scope_idx
+    on public.notifications (target_role, target_department)
+    where is_read = false;
@@ -0,0 +1,18 @@
+-- One decision notification (APPROVED / DECLINED) per visitor and target:
+-- add_notifications replaces it with INSERT ... ON CONFLICT DO UPDATE on
+-- this key instead of delete + insert. The key expression and predicate
+-- must match upsert_decision_notifications in FlaskApp.py.
+
+-- Drop older duplicates left by the delete + insert writers (keep newest)
+delete from public.notifications n
+using public.notifications newer
+where n.type in ('APPROVED', 'DECLINED')
+  and newer.type in ('APPROVED', 'DECLINED')
+  and newer.visitor_id = n.visitor_id
+  and newer.target_role = n.target_role
+  and coalesce(newer.target_department, '') = coalesce(n.target_department, '')
+  and newer.id > n.id;
+
+create unique index concurrently if not exists notifications_decision_key
+    on public.notifications (visitor_id, target_role, coalesce(target_department, ''))
+    where type in ('APPROVED', 'DECLINED');
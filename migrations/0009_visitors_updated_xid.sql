@@ -0,0 +1,22 @@
+-- Delta sync (?since=) follows the writing transaction id instead of
+-- updated_at: a row is only handed out once every transaction that could
+-- still commit an older change has finished
+-- (updated_xid < pg_snapshot_xmin(pg_current_snapshot())), however long
+-- that transaction runs. A clock-based hold-back window can't promise that.
+--
+-- Existing rows get xid 1 (older than anything running); the constant
+-- default makes the add column a catalog-only change, no table rewrite.
+alter table public.visitors add column if not exists updated_xid xid8 not null default '1';
+
+alter table public.visitors alter column updated_xid set default pg_current_xact_id();
+
+create or replace function public.set_updated_at() returns trigger as $$
+begin
+    new.updated_at := clock_timestamp();
+    new.updated_xid := pg_current_xact_id();
+    return new;
+end;
+$$ language plpgsql;
+
+create index concurrently if not exists visitors_updated_xid_idx
+    on public.visitors (updated_xid, id);
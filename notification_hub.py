@@ -0,0 +1,98 @@
+import threading
+from collections import deque
+
+# In-process fan-out of new notification rows to the SSE streams
+# (/api/notifications/stream). Each open stream holds a Subscription and
+# blocks in wait() until a matching row is published, so an idle client
+# costs one sleeping thread and no database work.
+#
+# Scope rules are the same as NOTIFICATION_SCOPES in FlaskApp.py:
+#   dep_head + department -> that department's rows and unassigned rows
+#   dep_head alone        -> unassigned rows only
+#   any other role        -> every row for the role
+
+# A stream that falls this far behind is closed; the client reconnects with
+# Last-Event-ID and catches up from the database.
+MAX_PENDING = 1000
+
+
+class Subscription:
+    def __init__(self, hub, role, department):
+        self.hub = hub
+        self.role = role
+        self.department = department
+        self.pending = deque()
+        self.ready = threading.Event()
+        self.closed = False
+
+    def matches(self, row) -> bool:
+        if row["target_role"] != self.role:
+            return False
+        if self.role != "dep_head":
+            return True
+        target = row["target_department"]
+        return target is None or (self.department is not None and target == self.department)
+
+    def wait(self, timeout):
+        # -> new rows ([] on timeout), or None once the subscription is
+        # closed (overflowed or hub shut down)
+        self.ready.wait(timeout)
+        with self.hub.lock:
+            if self.closed:
+                return None
+            rows = list(self.pending)
+            self.pending.clear()
+            self.ready.clear()
+        return rows
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class NotificationHub:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+
+    def subscribe(self, role, department=None) -> Subscription:
+        sub = Subscription(self, role, department)
+        with self.lock:
+            self.subscriptions.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscriptions.discard(sub)
+            sub.closed = True
+        sub.ready.set()
+
+    def publish(self, rows):
+        # rows: committed notifications (dicts with at least id, target_role,
+        # target_department), oldest first
+        with self.lock:
+            for sub in self.subscriptions:
+                matched = [row for row in rows if sub.matches(row)]
+                if not matched:
+                    continue
+                sub.pending.extend(matched)
+                if len(sub.pending) > MAX_PENDING:
+                    sub.closed = True
+                sub.ready.set()
+            self.subscriptions = {sub for sub in self.subscriptions if not sub.closed}
+
+    def close_all(self):
+        # Ends every stream (e.g. after missed events): clients reconnect
+        # with Last-Event-ID and resume from the database
+        with self.lock:
+            subs, self.subscriptions = self.subscriptions, set()
+            for sub in subs:
+                sub.closed = True
+        for sub in subs:
+            sub.ready.set()
+
+    def count(self) -> int:
+        with self.lock:
+            return len(self.subscriptions)
+
+
+hub = NotificationHub()
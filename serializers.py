@@ -0,0 +1,123 @@
+from operator import itemgetter
+
+# Row -> JSON-ready dict conversion for the visitor endpoints.
+#
+# Each endpoint names the fields it returns; visitor_columns() turns them
+# into the SELECT list (derived_status is computed by Postgres) and the
+# json_row row factory converts every row in one pass while it is fetched.
+
+# Display status: past visits become Completed / No-show, everything else
+# keeps the stored status. "Today" is Manila time, same as the app.
+DERIVED_STATUS_SQL = """
+    case
+        when visit_date < (now() at time zone 'Asia/Manila')::date then
+            case when time_in is not null then 'Completed' else 'No-show' end
+        else status
+    end
+"""
+
+# /api/admin/visitors and /api/dep/visitors
+VISITOR_LIST_FIELDS = (
+    "id", "name", "reason", "department", "person_to_visit",
+    "visit_date", "visit_time", "email", "valid_id",
+    "status", "derived_status",
+    "time_in", "time_out", "created_at",
+    "decision_note", "decided_by", "decided_at", "updated_at",
+)
+
+# /api/guard/visitor/<id>
+GUARD_VISITOR_FIELDS = (
+    "id", "name", "reason", "person_to_visit", "department",
+    "visit_date", "visit_time", "email", "valid_id",
+    "time_in", "time_out", "status", "created_at",
+    "decision_note", "decided_by", "decided_at",
+)
+
+# /api/guard/today
+GUARD_TODAY_FIELDS = (
+    "id", "name", "reason", "department", "person_to_visit",
+    "visit_date", "visit_time", "email", "status", "time_in", "time_out",
+)
+
+# /api/premises-status
+PREMISES_INSIDE_FIELDS = (
+    "id", "name", "department", "person_to_visit", "reason",
+    "visit_date", "visit_time", "time_in",
+)
+PREMISES_LEFT_FIELDS = (
+    "id", "name", "department", "person_to_visit", "reason",
+    "visit_date", "visit_time", "time_out",
+)
+
+
+# date / time / timestamptz columns, sent as ISO strings
+_ISO_COLUMNS = {
+    "visit_date", "visit_time",
+    "time_in", "time_out",
+    "created_at", "decided_at", "updated_at",
+}
+
+# Computed columns: name -> SQL expression
+_COMPUTED = {
+    "derived_status": DERIVED_STATUS_SQL,
+}
+
+
+def _picker(indexes):
+    # Like itemgetter(*indexes) but always returns a tuple
+    if len(indexes) == 1:
+        i = indexes[0]
+        return lambda values: (values[i],)
+    if not indexes:
+        return lambda values: ()
+    return itemgetter(*indexes)
+
+
+def json_row(cursor):
+    # psycopg row factory: builds the JSON-ready dict straight from the
+    # decoded column values, so each row is converted once and no
+    # intermediate dict_row is made. Dates, times and timestamps become
+    # ISO strings; every other column is passed through.
+    if cursor.description is None:
+        return tuple
+
+    names = [c.name for c in cursor.description]
+    plain = [i for i, name in enumerate(names) if name not in _ISO_COLUMNS]
+    iso = [i for i, name in enumerate(names) if name in _ISO_COLUMNS]
+
+    plain_names = [names[i] for i in plain]
+    iso_names = [names[i] for i in iso]
+    pick_plain = _picker(plain)
+    pick_iso = _picker(iso)
+
+    def make_row(values):
+        row = dict(zip(plain_names, pick_plain(values)))
+        row.update(zip(iso_names, [None if v is None else v.isoformat() for v in pick_iso(values)]))
+        return row
+
+    return make_row
+
+
+def visitor_columns(fields) -> str:
+    # SELECT list for `fields` (column names come from the constants above,
+    # never from user input)
+    return ",\n".join(
+        f"{_COMPUTED[f].strip()} as {f}" if f in _COMPUTED else f
+        for f in fields
+    )
+
+
+def project_fields(requested, allowed, required=("id",)) -> tuple:
+    # ?fields=name,status,... -> the fields to select, in `allowed` order.
+    # Empty / missing means all of `allowed`; `required` fields (row keys,
+    # paging keys) are always added. ValueError for a field not in `allowed`.
+    if not requested:
+        return tuple(allowed)
+
+    names = {f.strip() for f in requested.split(",") if f.strip()}
+    unknown = names.difference(allowed)
+    if unknown:
+        raise ValueError(f"Unknown field: {', '.join(sorted(unknown))}")
+
+    names.update(required)
+    return tuple(f for f in allowed if f in names)